@@ -0,0 +1,298 @@
+"""Edit-distance alignment scoring
+
+AlignmentEngine scores the input by its cheapest alignment with the
+target, updated incrementally as keys are typed and deleted. Run as a
+script, the module checks that incremental updates always leave both
+engines in the same state as scoring the current input from scratch:
+
+    python alignment.py --rounds 2000 --seed 1
+"""
+import argparse
+import random
+import sys
+from array import array
+
+from scoring import ScoringEngine
+
+
+BIG = 1 << 32  # one edit outweighs any number of matches
+INF = 1 << 62
+
+DIAG, UP, LEFT = 0, 1, 2  # match or substitution, extra typed char, skipped target char
+
+UNTOUCHED, CORRECT, WRONG = 0, 1, 2
+
+
+class AlignmentEngine(ScoringEngine):
+    """Scoring by edit-distance alignment of the input against the target
+
+    Comparing position by position turns every character after a skipped
+    or doubled letter into an error. This engine instead keeps the cheapest
+    alignment of the input with a prefix of the target: one edit-distance
+    DP row per typed character, valued edits * BIG - matches so that ties
+    go to the alignment with the most matches. Only a band of columns
+    around the previous row's best end is computed, so a keystroke costs
+    O(band) and a backspace just drops the last row.
+
+    After each change the best alignment is traced back only until it
+    meets the previous one, and the target positions whose state changed
+    are reported through take_changes like ScoringEngine does.
+
+    uncorrected_errors is the edit cost of the alignment, skipped letters
+    included. A backspace that lowers it adds the difference to
+    corrected_errors, and total_errors is always the sum of the two.
+    """
+
+    def __init__(self, target='', band=8):
+        self.band = band
+        super().__init__(target)
+
+    def reset(self, target):
+        """Start scoring a new target text"""
+        super().reset(target)
+        width = self.width = 2 * self.band + 1
+        self.correct = bytearray()  # 1 where the typed character is aligned to a match
+        self.states = bytearray(len(target))  # UNTOUCHED, CORRECT or WRONG per target position
+
+        # DP rows, flattened: row i covers target columns lo[i] .. lo[i] + width - 1
+        self.values = array('q', [j * BIG if j <= len(target) else INF for j in range(width)])
+        self.pointers = bytearray([LEFT] * width)
+        self.lo = array('l', [0])
+        self.best = array('l', [0])  # cheapest end column of each row
+
+        # Columns the current best alignment passes through in each row
+        self.path_lo = array('l', [0])
+        self.path_hi = array('l', [0])
+
+    @property
+    def cursor(self):
+        """Position in the target text where the next character is expected"""
+        return self.best[-1]
+
+    def target_state(self, index):
+        """True (typed correctly), False (mistyped or skipped) or None (not reached)"""
+        state = self.states[index]
+        return None if state == UNTOUCHED else state == CORRECT
+
+    def type_char(self, char):
+        """Score one typed character; True when it is aligned to a matching target character"""
+        self.typed.append(char)
+        self._text = None
+        self.correct.append(0)
+        self._push_row(char)
+        self._retrace(self.path_hi[-1])
+
+        self.total_errors = self.corrected_errors + self.uncorrected_errors
+        return bool(self.correct[-1])
+
+    def backspace(self):
+        """Remove the last typed character; returns the new cursor, or None if empty"""
+        if not self.typed:
+            return None
+
+        self.typed.pop()
+        self._text = None
+        self.correct.pop()
+
+        old_end = self.path_hi[-1]
+        width = self.width
+        del self.values[-width:]
+        del self.pointers[-width:]
+        self.lo.pop()
+        self.best.pop()
+        del self.path_lo[-1]
+        del self.path_hi[-1]
+        old_cost = self.uncorrected_errors
+        self._retrace(old_end)
+        self.corrected_errors += max(0, old_cost - self.uncorrected_errors)
+        self.total_errors = self.corrected_errors + self.uncorrected_errors
+        return self.cursor
+
+    def _push_row(self, char):
+        """Compute the DP row for a newly typed character"""
+        target = self.target
+        width = self.width
+        prev_lo = self.lo[-1]
+        base = (len(self.typed) - 1) * width
+        values = self.values
+        lo = max(0, self.best[-1] + 1 - self.band)
+
+        row = [INF] * width
+        pointers = bytearray([LEFT] * width)
+        best = lo
+        for k in range(width):
+            j = lo + k
+            if j > len(target):
+                break
+
+            value = INF
+            pointer = LEFT
+            p = j - 1 - prev_lo  # diagonal in the previous row
+            if j > 0 and 0 <= p < width and values[base + p] < INF:
+                value = values[base + p] + (-1 if char == target[j - 1] else BIG)
+                pointer = DIAG
+            p += 1  # straight up
+            if 0 <= p < width and values[base + p] + BIG < value:
+                value = values[base + p] + BIG
+                pointer = UP
+            if k > 0 and row[k - 1] + BIG < value:
+                value = row[k - 1] + BIG
+                pointer = LEFT
+
+            row[k] = value
+            pointers[k] = pointer
+            if value <= row[best - lo]:
+                best = j  # ties go to the furthest position
+
+        self.values.extend(row)
+        self.pointers.extend(pointers)
+        self.lo.append(lo)
+        self.best.append(best)
+
+    def _retrace(self, old_end):
+        """Follow the best alignment back to the previous one and apply what changed
+
+        old_end is where the previous alignment ended in the target.
+        """
+        width = self.width
+        i = len(self.typed)
+        j = self.best[i]
+
+        # Walk back until the path joins the previous alignment; from there on it is unchanged
+        cells = []
+        path_lo, path_hi = self.path_lo, self.path_hi
+        while not (i < len(path_lo) and path_lo[i] <= j <= path_hi[i]):
+            cells.append((i, j))
+            pointer = self.pointers[i * width + j - self.lo[i]]
+            if pointer == DIAG:
+                i -= 1
+                j -= 1
+            elif pointer == UP:
+                i -= 1
+            else:
+                j -= 1
+
+        del path_lo[i + 1:]
+        del path_hi[i + 1:]
+        path_hi[i] = j
+        start = j
+
+        # Re-apply the alignment from the join onwards
+        states = {}
+        for i, j in reversed(cells):
+            pointer = self.pointers[i * width + j - self.lo[i]]
+            if pointer == DIAG:
+                match = self.typed[i - 1] == self.target[j - 1]
+                states[j - 1] = CORRECT if match else WRONG
+                self.correct[i - 1] = match
+            elif pointer == UP:
+                self.correct[i - 1] = 0
+            else:
+                states[j - 1] = WRONG
+            if i < len(path_lo):
+                path_hi[i] = j
+            else:
+                path_lo.append(j)
+                path_hi.append(j)
+
+        for index in range(start, max(old_end, self.best[-1])):
+            state = states.get(index, UNTOUCHED)
+            if self.states[index] != state:
+                self.states[index] = state
+                self.changes.append(index)
+
+        value = self.values[len(self.typed) * width + self.best[-1] - self.lo[-1]]
+        cost = -(-value // BIG)
+        self.correct_chars = cost * BIG - value
+        self.uncorrected_errors = cost
+
+
+def engine_state(engine):
+    """The figures of an engine that must not depend on how its input was reached"""
+    return (engine.cursor, engine.correct_chars, engine.uncorrected_errors,
+            [engine.target_state(index) for index in range(len(engine.target))])
+
+
+def sloppy_keys(target, rng, error_rate=0.15):
+    """Keys of a typist who skips, doubles, mistypes and deletes characters; None is a backspace"""
+    keys = []
+    for char in target:
+        roll = rng.random()
+        if roll < error_rate / 4:
+            continue  # skipped
+        if roll < error_rate / 2:
+            keys.append(rng.choice(target))  # extra letter before the right one
+        elif roll < error_rate * 3 / 4:
+            keys.append(rng.choice(target))  # wrong letter instead
+            continue
+        elif roll < error_rate:
+            keys.extend([None] * rng.randint(1, 4))
+        keys.append(char)
+    return keys
+
+
+def check_incremental(engine_class, target, keys):
+    """Replay keys one at a time; returns a description of the first divergence, or None
+
+    After every key the engine is compared with a fresh engine fed the
+    current input, the target states are rebuilt from take_changes alone,
+    and total_errors must equal corrected_errors + uncorrected_errors.
+    """
+    engine = engine_class(target)
+    shown = [None] * len(target)  # target states as a renderer following take_changes sees them
+    for step, key in enumerate(keys):
+        if key is None:
+            engine.backspace()
+        else:
+            engine.type_char(key)
+        for index in engine.take_changes():
+            shown[index] = engine.target_state(index)
+
+        fresh = engine_class(target)
+        for char in engine.typed:
+            fresh.type_char(char)
+        expected = engine_state(fresh)
+        actual = engine_state(engine)
+        where = f"{engine_class.__name__} after key {step} ({engine.text!r} for {target!r})"
+        if actual[:3] != expected[:3]:
+            return f"{where}: cursor, correct, uncorrected {actual[:3]} != {expected[:3]} from scratch"
+        if actual[3] != expected[3]:
+            return f"{where}: target states differ from scratch"
+        if shown != expected[3]:
+            return f"{where}: take_changes missed a changed position"
+        if engine.total_errors != engine.corrected_errors + engine.uncorrected_errors:
+            return (f"{where}: total {engine.total_errors} != corrected {engine.corrected_errors}"
+                    f" + uncorrected {engine.uncorrected_errors}")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check that incremental scoring matches scoring the input from scratch')
+    parser.add_argument('corpus', nargs='?', default='sentences.txt', help='where target lines come from')
+    parser.add_argument('--rounds', type=int, default=500, help='sentences typed per engine')
+    parser.add_argument('--error-rate', type=float, default=0.15, help='share of keys typed sloppily')
+    parser.add_argument('--seed', type=int, help='random seed, for a reproducible run')
+    args = parser.parse_args()
+
+    from corpus import Corpus
+
+    rng = random.Random(args.seed)
+    corpus = Corpus(args.corpus)
+    failures = 0
+    try:
+        for engine_class in (ScoringEngine, AlignmentEngine):
+            for _ in range(args.rounds):
+                target = corpus.sample(rng)
+                problem = check_incremental(engine_class, target, sloppy_keys(target, rng, args.error_rate))
+                if problem:
+                    failures += 1
+                    print(problem)
+            print(f"{engine_class.__name__}: {args.rounds} rounds checked")
+    finally:
+        corpus.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
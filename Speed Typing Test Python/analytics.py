@@ -0,0 +1,215 @@
+"""Per-key and bigram latency analytics over recorded typing games
+
+Reads the keystroke logs saved in typing_history.jsonl (see keylog.py) and
+computes, with NumPy, per-character and per-bigram latency distributions and
+error rates plus WPM trends for each difficulty.
+
+    python analytics.py typing_history.jsonl --top 15
+"""
+import argparse
+import base64
+import json
+
+try:
+    import numpy as np
+except ImportError:  # analytics are optional; the game runs without NumPy
+    np = None
+
+from keylog import BACKSPACE, ENTER
+from stats_store import StatsStore
+
+
+def _column(data, dtype):
+    """Decode one base64 keystroke column into a NumPy array"""
+    return np.frombuffer(base64.b64decode(data, validate=True), dtype=dtype)
+
+
+def _decode_log(record):
+    """Keys, cumulative times, positions, correctness and target text of a record
+
+    Raises ValueError (or KeyError, TypeError, AttributeError) for a damaged log.
+    """
+    data = record['keystrokes']
+    keys = np.frombuffer(data['keys'].encode('utf-32-le'), dtype='<u4').astype(np.int64)
+    times = np.cumsum(_column(data['dt_ns'], '<i8'))
+    positions = _column(data['pos'], '<u4').astype(np.int64)
+    ok = _column(data['ok'], 'i1')
+    if not len(keys) == len(times) == len(positions) == len(ok):
+        raise ValueError("keystroke columns differ in length")
+    target = np.frombuffer(record.get('text', '').encode('utf-32-le'), dtype='<u4').astype(np.int64)
+    return keys, times, positions, ok, target
+
+
+def load_keystrokes(records, max_gap_ms=2000):
+    """Flatten the keystroke logs of many games into NumPy columns
+
+    Returns a dict of equally long arrays, one entry per typed character:
+    'char' and 'prev' (code points of the target character the key was meant
+    to produce and of the one before it; prev is -1 after a backspace),
+    'latency_ms' since the previous keystroke, 'correct' (1, 0 or -1 when
+    not scored) and 'game'. Pauses longer than max_gap_ms are dropped from
+    the latency data, since they measure the typist rather than the key.
+    Records whose log is damaged are skipped.
+    """
+    chars, prevs, latencies, correct, games = [], [], [], [], []
+    for game_index, record in enumerate(records):
+        if not record.get('keystrokes'):
+            continue
+        try:
+            keys, times, positions, ok, target = _decode_log(record)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            continue
+        if not len(keys):
+            continue
+
+        typed = (keys != ord(BACKSPACE)) & (keys != ord(ENTER))
+        latency = np.diff(times, prepend=times[0]) / 1e6
+
+        # Attribute each keystroke to the character it should have produced
+        intended = keys.copy()
+        prev = np.full(len(keys), -1, dtype=np.int64)
+        if len(target):
+            in_target = positions < len(target)
+            intended[in_target] = target[positions[in_target]]
+            has_prev = in_target & (positions > 0)
+            prev[has_prev] = target[positions[has_prev] - 1]
+        prev[~np.concatenate(([False], typed[:-1]))] = -1
+
+        keep = typed & (latency > 0) & (latency <= max_gap_ms)
+        keep[0] = False  # the first keystroke has no previous key to time against
+        chars.append(intended[keep])
+        prevs.append(prev[keep])
+        latencies.append(latency[keep])
+        correct.append(ok[keep])
+        games.append(np.full(int(keep.sum()), game_index, dtype=np.int64))
+
+    if not chars:
+        empty = np.zeros(0, dtype=np.int64)
+        return {'char': empty, 'prev': empty, 'latency_ms': np.zeros(0), 'correct': empty, 'game': empty}
+
+    return {
+        'char': np.concatenate(chars),
+        'prev': np.concatenate(prevs),
+        'latency_ms': np.concatenate(latencies),
+        'correct': np.concatenate(correct).astype(np.int64),
+        'game': np.concatenate(games)
+    }
+
+
+def _grouped_stats(keys, latency, correct, min_count):
+    """Count, error rate and latency percentiles for every distinct key"""
+    if len(keys) == 0:
+        return []
+
+    unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    errors = np.bincount(inverse, weights=(correct == 0), minlength=len(unique))
+    mean = np.bincount(inverse, weights=latency, minlength=len(unique)) / counts
+
+    # Sort latencies within each group to read percentiles by offset
+    sorted_latency = latency[np.lexsort((latency, inverse))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    p50 = sorted_latency[starts + (counts - 1) * 50 // 100]
+    p90 = sorted_latency[starts + (counts - 1) * 90 // 100]
+
+    rows = []
+    for i in np.nonzero(counts >= min_count)[0]:
+        rows.append({
+            'key': int(unique[i]),
+            'count': int(counts[i]),
+            'error_rate': float(errors[i] / counts[i]),
+            'mean_ms': float(mean[i]),
+            'p50_ms': float(p50[i]),
+            'p90_ms': float(p90[i])
+        })
+    return rows
+
+
+def char_stats(keystrokes, min_count=5):
+    """Latency distribution and error rate per target character, slowest first"""
+    rows = _grouped_stats(keystrokes['char'], keystrokes['latency_ms'], keystrokes['correct'], min_count)
+    for row in rows:
+        row['char'] = chr(row.pop('key'))
+    return sorted(rows, key=lambda row: row['mean_ms'], reverse=True)
+
+
+def bigram_stats(keystrokes, min_count=5):
+    """Latency distribution and error rate per (previous, current) character pair"""
+    has_prev = keystrokes['prev'] >= 0
+    pairs = keystrokes['prev'][has_prev] * 0x110000 + keystrokes['char'][has_prev]
+    rows = _grouped_stats(pairs, keystrokes['latency_ms'][has_prev],
+                          keystrokes['correct'][has_prev], min_count)
+    for row in rows:
+        key = row.pop('key')
+        row['bigram'] = chr(key // 0x110000) + chr(key % 0x110000)
+    return sorted(rows, key=lambda row: row['mean_ms'], reverse=True)
+
+
+def wpm_trends(records, window=10):
+    """Per difficulty: games played, recent average WPM and WPM change per game"""
+    by_difficulty = {}
+    for record in records:
+        wpm = record.get('wpm')
+        if isinstance(wpm, (int, float)):  # records without a usable WPM are skipped
+            by_difficulty.setdefault(str(record.get('difficulty', 'unknown')), []).append(wpm)
+
+    trends = {}
+    for difficulty, values in by_difficulty.items():
+        wpm = np.asarray(values, dtype=float)
+        slope = float(np.polyfit(np.arange(len(wpm)), wpm, 1)[0]) if len(wpm) > 1 else 0.0
+        trends[difficulty] = {
+            'games': len(wpm),
+            'recent_wpm': float(wpm[-window:].mean()),
+            'best_wpm': float(wpm.max()),
+            'wpm_per_game': slope
+        }
+    return trends
+
+
+def analyze(records, min_count=5):
+    """Full analytics report for an iterable of game records"""
+    if np is None:
+        raise RuntimeError("NumPy is required for typing analytics")
+
+    records = [record for record in records if isinstance(record, dict)]
+    keystrokes = load_keystrokes(records)
+    return {
+        'games': len(records),
+        'keystrokes': int(len(keystrokes['char'])),
+        'chars': char_stats(keystrokes, min_count),
+        'bigrams': bigram_stats(keystrokes, min_count),
+        'trends': wpm_trends(records)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Typing latency and error analytics')
+    parser.add_argument('history', nargs='?', default='typing_history.jsonl',
+                        help='game history file written by the typing test')
+    parser.add_argument('--top', type=int, default=10, help='rows to show per table')
+    parser.add_argument('--min-count', type=int, default=5,
+                        help='ignore characters and bigrams seen fewer times')
+    parser.add_argument('--json', metavar='PATH', help='write the full report as JSON')
+    args = parser.parse_args()
+
+    report = analyze(StatsStore(history_path=args.history).iter_history(), args.min_count)
+    print(f"{report['games']} games, {report['keystrokes']} timed keystrokes\n")
+
+    print("WPM trends by difficulty")
+    for difficulty, trend in sorted(report['trends'].items()):
+        print(f"  {difficulty:<8} games {trend['games']:>6}  recent {trend['recent_wpm']:6.1f}  "
+              f"best {trend['best_wpm']:6.1f}  change/game {trend['wpm_per_game']:+.3f}")
+
+    for title, rows, label in (("Slowest characters", report['chars'], 'char'),
+                               ("Slowest bigrams", report['bigrams'], 'bigram')):
+        print(f"\n{title}")
+        for row in rows[:args.top]:
+            print(f"  {row[label]!r:<8} n={row['count']:<7} mean {row['mean_ms']:6.1f} ms  "
+                  f"p50 {row['p50_ms']:6.1f}  p90 {row['p90_ms']:6.1f}  errors {row['error_rate']:6.1%}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
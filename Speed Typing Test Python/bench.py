@@ -0,0 +1,220 @@
+"""Headless replay harness and rendering benchmark for TypingGame
+
+Runs the game with SDL's dummy video driver, feeds scripted keystroke
+streams through the real event path (handle_event, render_frame) and
+reports frame times, keystroke-to-frame latency and allocations per frame
+for every Difficulty, every Theme and synthetic passages of growing length.
+
+Keystrokes are spaced at a typing speed with jitter on a virtual game
+clock. Between two keys the idle frames the main loop would draw (cursor
+blink, live stats) are rendered and timed too, without waiting in real time.
+
+    python bench.py
+    python bench.py --lengths 50 1000 10000 --json bench.json
+    python bench.py --cps 12 --jitter 0.8
+"""
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import importlib.util
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pygame
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_game_module():
+    """Import 'speed typing.py', whose file name is not a valid module name"""
+    spec = importlib.util.spec_from_file_location('speed_typing', os.path.join(HERE, 'speed typing.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def keystroke_script(text, error_rate, rng, cps=6.0, jitter=0.5):
+    """Timed keystrokes that type text, with occasional mistakes fixed by backspace
+
+    Returns (delay in seconds since the previous key, char, key) tuples at
+    about cps characters per second, each delay varied by up to +-jitter.
+    """
+    def delay():
+        return max(0.0, (1 + jitter * rng.uniform(-1, 1)) / cps)
+
+    script = []
+    for char in text:
+        if rng.random() < error_rate:
+            script.append((delay(), 'x' if char != 'x' else 'y', 0))
+            script.append((delay(), '', pygame.K_BACKSPACE))
+        script.append((delay(), char, 0))
+    return script
+
+
+def synthetic_passage(corpus, length, rng):
+    """Join corpus sentences until the passage reaches length characters"""
+    parts = []
+    total = 0
+    while total < length:
+        sentence = corpus.sample(rng)
+        parts.append(sentence)
+        total += len(sentence) + 1
+    return ' '.join(parts)[:length].rstrip() or 'a' * length
+
+
+def run_case(game, text, args, rng):
+    """Type text through the game on a virtual clock and collect per-frame measurements"""
+    # Any non-zero epoch works; zero would read as "timer not started"
+    clock_ns = 10 ** 9
+    game.clock_ns = lambda: clock_ns
+    game.reset_game(text)
+    game.handle_event(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=game.input_rect.center, button=1))
+    game.render_frame()
+
+    frame_ms = []
+    latency_ms = []
+    idle_ms = []
+    alloc_blocks = []
+    alloc_kib = []
+
+    for delay, char, key in keystroke_script(text, args.error_rate, rng, args.cps, args.jitter):
+        if game.end:
+            break
+
+        # The frames the main loop draws when its idle wait times out before the key arrives
+        due_ns = clock_ns + int(delay * 1e9)
+        while True:
+            timeout = game.idle_timeout()
+            if timeout is None or clock_ns + timeout * 1_000_000 >= due_ns:
+                break
+            clock_ns += timeout * 1_000_000
+            frame_start = time.perf_counter()
+            game.render_frame()
+            idle_ms.append((time.perf_counter() - frame_start) * 1000)
+        clock_ns = due_ns
+
+        blocks_before = sys.getallocatedblocks()
+        if args.tracemalloc:
+            tracemalloc.reset_peak()
+
+        posted = time.perf_counter()
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, unicode=char, mod=0, scancode=0))
+        for event in pygame.event.get():
+            game.handle_event(event)
+        frame_start = time.perf_counter()
+        game.render_frame()
+        done = time.perf_counter()
+
+        frame_ms.append((done - frame_start) * 1000)
+        latency_ms.append((done - posted) * 1000)
+        alloc_blocks.append(sys.getallocatedblocks() - blocks_before)
+        if args.tracemalloc:
+            alloc_kib.append(tracemalloc.get_traced_memory()[1] / 1024)
+
+    game.clock_ns = time.perf_counter_ns
+    result = {
+        'chars': len(text),
+        'frames': len(frame_ms),
+        'frame_p50_ms': percentile(frame_ms, 50),
+        'frame_p95_ms': percentile(frame_ms, 95),
+        'frame_p99_ms': percentile(frame_ms, 99),
+        'frame_max_ms': max(frame_ms, default=0.0),
+        'latency_p50_ms': percentile(latency_ms, 50),
+        'latency_p95_ms': percentile(latency_ms, 95),
+        'idle_frames': len(idle_ms),
+        'idle_p95_ms': percentile(idle_ms, 95),
+        'net_blocks_per_frame': sum(alloc_blocks) / max(len(alloc_blocks), 1),
+    }
+    if args.tracemalloc:
+        result['peak_kib_per_frame'] = sum(alloc_kib) / max(len(alloc_kib), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless TypingGame rendering benchmark')
+    parser.add_argument('--lengths', type=int, nargs='+', default=[50, 200, 1000, 10000],
+                        help='synthetic passage lengths in characters')
+    parser.add_argument('--error-rate', type=float, default=0.05,
+                        help='fraction of keystrokes that are mistakes fixed with backspace')
+    parser.add_argument('--cps', type=float, default=6.0,
+                        help='typing speed in keystrokes per second (6 is about 70 WPM)')
+    parser.add_argument('--jitter', type=float, default=0.5,
+                        help='fraction by which each delay between keystrokes varies')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--full-redraw', action='store_true',
+                        help='disable dirty-rectangle rendering for comparison')
+    parser.add_argument('--alignment', action='store_true',
+                        help='score with the edit-distance alignment engine')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='also report peak traced memory per frame (slower)')
+    parser.add_argument('--json', metavar='PATH', help='write the results as JSON')
+    args = parser.parse_args()
+    if args.tracemalloc and not hasattr(tracemalloc, 'reset_peak'):
+        parser.error('--tracemalloc needs Python 3.9 or newer')
+
+    os.chdir(HERE)
+    module = load_game_module()
+    rng = random.Random(args.seed)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    with tempfile.TemporaryDirectory() as stats_dir:
+        game = module.TypingGame(stats_dir=stats_dir)
+        game.splash_pending = False  # measure rounds, not the startup fade
+        game.assets.thread.join()
+        game.difficulty_thread.join()
+        game.get_ngrams()
+        game.ngrams_thread.join()  # the adaptive case types generated drills, not the fallback
+        game.dirty_rendering = not args.full_redraw
+        game.alignment_mode = args.alignment
+
+        cases = []
+        for difficulty in module.Difficulty:
+            game.difficulty = difficulty
+            cases.append((f"difficulty={difficulty.value}", module.Theme.DARK, game.get_text_by_difficulty()))
+        game.difficulty = module.Difficulty.MEDIUM
+        for theme in module.Theme:
+            cases.append((f"theme={theme.value}", theme, game.get_text_by_difficulty()))
+        for length in args.lengths:
+            cases.append((f"passage={length}", module.Theme.DARK, synthetic_passage(game.corpus, length, rng)))
+
+        results = {}
+        print(f"{'case':<20}{'frames':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'max ms':>9}{'lat p95':>9}{'blocks':>9}{'idle':>7}{'idle p95':>9}")
+        for name, theme, text in cases:
+            game.theme = theme
+            game.set_theme_colors()
+            result = run_case(game, text, args, rng)
+            results[name] = result
+            print(f"{name:<20}{result['frames']:>8}{result['frame_p50_ms']:>9.3f}{result['frame_p95_ms']:>9.3f}"
+                  f"{result['frame_p99_ms']:>9.3f}{result['frame_max_ms']:>9.3f}"
+                  f"{result['latency_p95_ms']:>9.3f}{result['net_blocks_per_frame']:>9.1f}"
+                  f"{result['idle_frames']:>7}{result['idle_p95_ms']:>9.3f}")
+
+        game.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
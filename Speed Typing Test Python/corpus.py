@@ -0,0 +1,125 @@
+import mmap
+import os
+import random
+import threading
+from array import array
+
+
+DEFAULT_SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Programming is the art of telling another human what one wants the computer to do.",
+    "In order to understand recursion, you must first understand recursion."
+]
+
+
+class Corpus:
+    """Line-per-sentence text corpus sampled through a memory-mapped file
+
+    Only the byte offset of every non-empty line is kept in memory, so a
+    corpus with millions of lines costs a few bytes per line and picking a
+    sentence is a single random index plus one line read.
+    """
+
+    def __init__(self, path, fallback=None):
+        self.path = path
+        self.fallback = list(fallback or DEFAULT_SENTENCES)
+        self.file = None
+        self.mm = None
+        self.offsets = None  # start offset of each non-empty line
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Map the corpus file and index its lines (only done once, from any thread)"""
+        if self.offsets is not None:
+            return
+        with self.lock:
+            if self.offsets is None:
+                self.offsets = self._index_lines()
+
+    def _index_lines(self):
+        offsets = array('Q')
+        try:
+            self.file = open(self.path, 'rb')
+            if os.fstat(self.file.fileno()).st_size == 0:
+                return offsets
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return offsets
+
+        mm = self.mm
+        size = len(mm)
+        start = 0
+        while start < size:
+            end = mm.find(b'\n', start)
+            if end == -1:
+                end = size
+            line = mm[start:end].strip()
+            if line:
+                offsets.append(start)
+            start = end + 1
+        return offsets
+
+    def close(self):
+        """Release the memory map and file handle"""
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __len__(self):
+        self.load()
+        return len(self.offsets) or len(self.fallback)
+
+    def line(self, index):
+        """Return the sentence stored at index"""
+        self.load()
+        if not self.offsets:
+            return self.fallback[index]
+
+        start = self.offsets[index]
+        end = self.mm.find(b'\n', start)
+        if end == -1:
+            end = len(self.mm)
+        return self.mm[start:end].decode('utf-8', errors='replace').strip()
+
+    def iter_text(self, chunk_size=1 << 20):
+        """Yield the whole corpus as blocks of complete lines, for bulk processing"""
+        self.load()
+        if not self.offsets:
+            yield '\n'.join(self.fallback)
+            return
+
+        mm = self.mm
+        start = 0
+        while start < len(mm):
+            end = len(mm)
+            if start + chunk_size < end:
+                end = mm.rfind(b'\n', start, start + chunk_size)
+                if end <= start:
+                    end = mm.find(b'\n', start + chunk_size)
+                    end = len(mm) if end == -1 else end
+            yield mm[start:end].decode('utf-8', errors='replace')
+            start = end + 1
+
+    def sample(self, rng=random, wait=True):
+        """Pick a random sentence in constant time
+
+        With wait=False the corpus is never indexed on the calling thread:
+        until another thread's load has finished, a fallback sentence is
+        returned instead of waiting for it.
+        """
+        if not wait and self.offsets is None:
+            return rng.choice(self.fallback)
+        return self.line(rng.randrange(len(self)))
+
+    def sample_passage(self, length, rng=random, wait=True):
+        """Build paragraphs of random sentences totalling about length characters"""
+        paragraphs = []
+        total = 0
+        while total < length:
+            paragraph = ' '.join(self.sample(rng, wait) for _ in range(rng.randint(3, 6)))
+            paragraphs.append(paragraph)
+            total += len(paragraph) + 1
+        return '\n'.join(paragraphs)
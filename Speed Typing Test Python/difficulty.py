@@ -0,0 +1,245 @@
+"""Difficulty index of the sentence corpus
+
+Every corpus line is rated once from its length, the density of symbols,
+digits and capital letters, and the share of its bigrams that are rare in
+the corpus. Lines are then sorted by rating and split into one bucket per
+difficulty level, so a round only picks a random position inside a slice.
+
+The ratings and the sorted line indices are kept in a binary sidecar file:
+a JSON header line with the corpus file's mtime, size and SHA-1, followed
+by the raw arrays, always little-endian. A corpus whose mtime changed but
+whose content did not (a copy or a touch) is recognised by its hash and
+not rescored.
+
+    python difficulty.py sentences.txt --level expert --count 5
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from collections import Counter
+
+
+VERSION = 1
+
+# Share of the corpus in each level, easiest first
+LEVELS = (('easy', 0.30), ('medium', 0.35), ('hard', 0.25), ('expert', 0.10))
+
+LENGTH_SCALE = 40  # characters worth one point
+SYMBOL_WEIGHT = 20.0
+DIGIT_WEIGHT = 15.0
+CAPITAL_WEIGHT = 10.0
+RARE_BIGRAM_WEIGHT = 8.0
+COMMON_COVERAGE = 0.9  # the most frequent bigrams covering this share of the corpus are common
+BIGRAM_SAMPLE = 50000  # lines read to count bigrams
+PLAIN_PUNCTUATION = ".,'"
+WORD_CACHE = 1 << 18  # words whose bigram counts are remembered while rating
+
+
+def file_sha1(path):
+    """SHA-1 of a file's content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def bigrams(text):
+    """Lower-case letter pairs of a text; pairs with punctuation are left to the symbol density"""
+    lower = text.lower()
+    return filter(str.isalpha, map(str.__add__, lower, lower[1:]))
+
+
+def common_bigrams(lines):
+    """The most frequent bigrams of some lines, covering COMMON_COVERAGE of all occurrences"""
+    counter = Counter()
+    for line in lines:
+        counter.update(bigrams(line))
+
+    common = set()
+    needed = COMMON_COVERAGE * sum(counter.values())
+    covered = 0
+    for bigram, count in counter.most_common():
+        if covered >= needed:
+            break
+        common.add(bigram)
+        covered += count
+    return common
+
+
+def word_features(word, common):
+    """(digits, capitals, symbols, letter pairs, rare letter pairs) of a whitespace-free word"""
+    pairs = list(bigrams(word))
+    symbols = (len(word) - sum(map(str.isalnum, word))
+               - sum(word.count(char) for char in PLAIN_PUNCTUATION))
+    return (sum(map(str.isdigit, word)), sum(map(str.isupper, word)), symbols,
+            len(pairs), len(pairs) - sum(map(common.__contains__, pairs)))
+
+
+def line_difficulty(text, common, cache=None):
+    """Rating of one line; higher is harder
+
+    Letter pairs never span whitespace, so every feature is counted word
+    by word. cache maps words to their word_features; words repeat so much
+    across a corpus that rating with a shared cache is several times faster.
+    """
+    n = len(text)
+    if not n:
+        return 0.0
+    if cache is None:
+        cache = {}
+
+    features = []
+    for word in text.split():
+        counts = cache.get(word)
+        if counts is None:
+            counts = word_features(word, common)
+            if len(cache) < WORD_CACHE:
+                cache[word] = counts
+        features.append(counts)
+    digits, capitals, symbols, pairs, rare = map(sum, zip(*features)) if features else (0,) * 5
+    capitals -= text[0].isupper()  # a capital first letter is free
+
+    return (n / LENGTH_SCALE
+            + SYMBOL_WEIGHT * symbols / n
+            + DIGIT_WEIGHT * digits / n
+            + CAPITAL_WEIGHT * capitals / n
+            + RARE_BIGRAM_WEIGHT * rare / max(pairs, 1))
+
+
+class DifficultyIndex:
+    """Corpus lines rated by difficulty and split into one bucket per level"""
+
+    def __init__(self, corpus, scores, order, cuts):
+        self.corpus = corpus
+        self.scores = scores  # rating of every line, by line index
+        self.order = order  # line indices from easiest to hardest
+        self.cuts = cuts  # level name -> (start, end) slice of order
+
+    @classmethod
+    def build(cls, corpus):
+        """Rate every line of a Corpus and bucket the lines"""
+        count = len(corpus)
+        step = max(1, count // BIGRAM_SAMPLE)
+        common = common_bigrams(corpus.line(i) for i in range(0, count, step))
+
+        cache = {}
+        scores = array('f', (line_difficulty(corpus.line(i), common, cache) for i in range(count)))
+        order = array('I', sorted(range(count), key=scores.__getitem__))
+
+        cuts = {}
+        start = 0
+        share = 0.0
+        for level, level_share in LEVELS:
+            share += level_share
+            end = count if level == LEVELS[-1][0] else round(share * count)
+            cuts[level] = (start, end)
+            start = end
+        return cls(corpus, scores, order, cuts)
+
+    @classmethod
+    def for_corpus(cls, corpus, index_path):
+        """Index of a Corpus, from the sidecar file when it matches the corpus file"""
+        try:
+            st = os.stat(corpus.path)
+        except OSError:
+            return cls.build(corpus)  # the fallback sentences are not worth caching
+        stamp = {'version': VERSION, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+        sha1 = None
+        try:
+            with open(index_path, 'rb') as f:
+                header = json.loads(f.readline())
+                if header['stamp'] != stamp:
+                    # Same content under a new mtime still matches by hash
+                    same_file = {**header['stamp'], 'mtime_ns': st.st_mtime_ns} == stamp
+                    sha1 = file_sha1(corpus.path) if same_file else None
+                    if sha1 != header['sha1']:
+                        raise ValueError('corpus changed')
+                scores = array('f')
+                order = array('I')
+                scores.fromfile(f, header['lines'])
+                order.fromfile(f, header['lines'])
+                if sys.byteorder == 'big':
+                    scores.byteswap()
+                    order.byteswap()
+            if header['lines'] == len(corpus):
+                index = cls(corpus, scores, order, {level: tuple(cut) for level, cut in header['cuts'].items()})
+                if sha1:
+                    index.save(index_path, stamp, sha1)
+                return index
+        except (OSError, EOFError, ValueError, KeyError, TypeError):
+            pass
+
+        index = cls.build(corpus)
+        try:
+            index.save(index_path, stamp, sha1 or file_sha1(corpus.path))
+        except OSError:
+            pass  # a read-only directory only costs a rebuild next time
+        return index
+
+    def save(self, path, stamp, sha1):
+        """Atomically write the index for a corpus stamp and hash"""
+        header = {'stamp': stamp, 'sha1': sha1, 'lines': len(self.scores), 'cuts': self.cuts}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header, separators=(',', ':')).encode('utf-8') + b'\n')
+            for values in (self.scores, self.order):
+                if sys.byteorder == 'big':
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+        os.replace(tmp_path, path)
+
+    def bucket(self, level):
+        """Slice of order for a level, borrowing from the nearest level when it is empty"""
+        names = [name for name, _ in LEVELS]
+        position = names.index(level)
+        for distance in range(len(names)):
+            for candidate in (position + distance, position - distance):
+                if 0 <= candidate < len(names):
+                    start, end = self.cuts[names[candidate]]
+                    if end > start:
+                        return start, end
+        return 0, len(self.order)
+
+    def sample(self, level, rng=random):
+        """Pick a random sentence of a difficulty level in constant time"""
+        start, end = self.bucket(level)
+        if end == start:
+            return self.corpus.sample(rng)
+        return self.corpus.line(self.order[start + rng.randrange(end - start)])
+
+
+def main():
+    from corpus import Corpus
+
+    parser = argparse.ArgumentParser(description='Rate corpus lines by difficulty and print samples')
+    parser.add_argument('corpus', nargs='?', default='sentences.txt')
+    parser.add_argument('--index', default='typing_difficulty.idx', help='where the index is kept')
+    parser.add_argument('--level', choices=[name for name, _ in LEVELS])
+    parser.add_argument('--count', type=int, default=3, help='sentences printed per level')
+    args = parser.parse_args()
+
+    corpus = Corpus(args.corpus)
+    start = time.perf_counter()
+    index = DifficultyIndex.for_corpus(corpus, args.index)
+    loaded = time.perf_counter()
+    print(f"{len(index.order)} lines indexed in {(loaded - start) * 1000:.0f} ms")
+
+    for level, _ in LEVELS:
+        if args.level in (None, level):
+            start, end = index.cuts[level]
+            print(f"\n{level} ({end - start} lines)")
+            for _ in range(args.count):
+                print(f"  {index.sample(level)}")
+    corpus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import base64
+import sys
+from array import array
+
+
+BACKSPACE = '\b'
+ENTER = '\r'
+
+
+def _pack(values):
+    """Encode an array as little-endian base64 text"""
+    packed = array(values.typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+
+def _unpack(typecode, data):
+    """Decode base64 text written by _pack"""
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class KeystrokeLog:
+    """Every keystroke of a round in compact, array-backed columns
+
+    Each entry stores a perf_counter_ns timestamp, the key (the typed
+    character, BACKSPACE or ENTER), the input position it applied to and
+    whether it was correct (1), wrong (0) or not scored (-1). That is 17
+    bytes per keystroke, so memory stays flat over long sessions.
+    """
+
+    def __init__(self, start_ns=0):
+        self.start_ns = start_ns
+        self.times = array('q')
+        self.keys = array('I')  # code points
+        self.positions = array('I')
+        self.correct = array('b')
+
+    def __len__(self):
+        return len(self.times)
+
+    def record(self, time_ns, key, position, correct=None):
+        """Append one keystroke"""
+        self.times.append(time_ns)
+        self.keys.append(ord(key))
+        self.positions.append(position)
+        self.correct.append(-1 if correct is None else int(correct))
+
+    def entries(self):
+        """Yield (time_ns, key, position, correct) tuples in order"""
+        for i in range(len(self.times)):
+            correct = self.correct[i]
+            yield (self.times[i], chr(self.keys[i]), self.positions[i],
+                   None if correct < 0 else bool(correct))
+
+    def to_dict(self):
+        """Serialize for a game record; times become deltas from the round start"""
+        deltas = array('q')
+        previous = self.start_ns
+        for t in self.times:
+            deltas.append(t - previous)
+            previous = t
+        return {
+            'keys': ''.join(map(chr, self.keys)),
+            'dt_ns': _pack(deltas),
+            'pos': _pack(self.positions),
+            'ok': _pack(self.correct)
+        }
+
+    @classmethod
+    def from_dict(cls, data, start_ns=0):
+        """Rebuild a log saved with to_dict, with times relative to start_ns"""
+        log = cls(start_ns)
+        log.keys = array('I', map(ord, data['keys']))
+        log.positions = _unpack('I', data['pos'])
+        log.correct = _unpack('b', data['ok'])
+        t = start_ns
+        for delta in _unpack('q', data['dt_ns']):
+            t += delta
+            log.times.append(t)
+        return log
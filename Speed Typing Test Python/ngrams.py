@@ -0,0 +1,242 @@
+"""Adaptive practice text built from n-gram tables of the corpus
+
+The corpus is tokenized once into its most common words (whitespace
+tokens, punctuation included) with an index from every character and
+every bigram, spaces included, to the common words containing it. The
+tables are cached as JSON and rebuilt when the corpus file changes, so a
+round only costs a few random picks from ready-made lists.
+
+What to practise comes from a per-key profile kept in the aggregates:
+decayed latency and error sums per target character and bigram, updated
+from the keystroke log of every game.
+
+    python ngrams.py sentences.txt --weak q z th --length 200
+"""
+import argparse
+import json
+import os
+import random
+import time
+from bisect import bisect
+from collections import Counter
+from itertools import accumulate
+
+from keylog import BACKSPACE, ENTER
+
+
+VERSION = 1
+MAX_WORDS = 20000
+MAX_WORD_LENGTH = 20
+CHAR_POOL = 200  # most common words kept per character
+BIGRAM_POOL = 50  # most common words kept per bigram
+
+PROFILE_DECAY = 0.9  # weight of a game in the profile halves about every 7 games
+PROFILE_BIGRAMS = 500
+ERROR_WEIGHT = 5.0  # a 10% error rate counts like being 50% slower
+
+
+def corpus_stamp(path):
+    """What the cache is valid for: the corpus file's mtime and size"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {'version': VERSION, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+class NGramTables:
+    """Common words of a corpus indexed by the characters and bigrams they contain"""
+
+    def __init__(self, words, counts, by_char, by_bigram):
+        self.words = words
+        self.counts = counts
+        self.by_char = by_char
+        self.by_bigram = by_bigram
+        # Flattened frequencies (square root) for plain word picks
+        self.cumulative = list(accumulate(c ** 0.5 for c in counts))
+
+    @classmethod
+    def build(cls, texts):
+        """Count the words of an iterable of texts (lines or larger blocks) and index them"""
+        counter = Counter()
+        for text in texts:
+            counter.update(text.split())
+
+        words, counts = [], []
+        for word, count in counter.most_common():
+            if len(word) <= MAX_WORD_LENGTH:
+                words.append(word)
+                counts.append(count)
+                if len(words) == MAX_WORDS:
+                    break
+
+        # Words are in frequency order, so each pool keeps the most common ones
+        by_char, by_bigram = {}, {}
+        for index, word in enumerate(words):
+            for char in set(word):
+                pool = by_char.setdefault(char, [])
+                if len(pool) < CHAR_POOL:
+                    pool.append(index)
+            padded = f" {word} "
+            for bigram in {padded[i:i + 2] for i in range(len(padded) - 1)}:
+                pool = by_bigram.setdefault(bigram, [])
+                if len(pool) < BIGRAM_POOL:
+                    pool.append(index)
+        return cls(words, counts, by_char, by_bigram)
+
+    @classmethod
+    def for_corpus(cls, corpus, cache_path):
+        """Tables for a Corpus, from the cache when it matches the corpus file"""
+        stamp = corpus_stamp(corpus.path)
+        if stamp is None:
+            return cls.build(corpus.fallback)
+
+        try:
+            with open(cache_path, 'r') as f:
+                data = json.load(f)
+            if data.get('stamp') == stamp:
+                return cls(data['words'], data['counts'], data['by_char'], data['by_bigram'])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+        tables = cls.build(corpus.iter_text())
+        try:
+            tables.save(cache_path, stamp)
+        except OSError:
+            pass  # a read-only directory only costs a rebuild next time
+        return tables
+
+    def save(self, path, stamp):
+        """Atomically write the tables for a corpus stamp"""
+        data = {
+            'stamp': stamp,
+            'words': self.words,
+            'counts': self.counts,
+            'by_char': self.by_char,
+            'by_bigram': self.by_bigram
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def pool(self, key):
+        """Indices of common words containing a character or bigram"""
+        return (self.by_bigram if len(key) == 2 else self.by_char).get(key)
+
+    def generate(self, weak=(), length=180, focus=0.6, rng=random):
+        """Practice text of about length characters
+
+        weak is a list of (key, weight) pairs; a fraction focus of the words
+        is drawn from the pools of those keys, the rest by word frequency.
+        """
+        if not self.words:
+            return ''
+
+        pools, weights = [], []
+        for key, weight in weak:
+            pool = self.pool(key)
+            if pool:
+                pools.append(pool)
+                weights.append(weight)
+
+        words = []
+        total = 0
+        while total < length:
+            if pools and rng.random() < focus:
+                pool = rng.choices(pools, weights)[0]
+                word = self.words[pool[rng.randrange(len(pool))]]
+            else:
+                index = bisect(self.cumulative, rng.random() * self.cumulative[-1])
+                word = self.words[min(index, len(self.words) - 1)]
+            words.append(word)
+            total += len(word) + 1
+        return ' '.join(words)
+
+
+def update_key_profile(profile, log, text, max_gap_ms=2000):
+    """Return profile with one game's keystrokes folded in
+
+    Each entry is [latency sum in ms, error sum, count] for a target
+    character ('chars') or bigram ('bigrams'). Older games are decayed
+    by PROFILE_DECAY. A new dict is returned, so a snapshot already
+    handed to the stats writer is never modified.
+    """
+    game = {'chars': {}, 'bigrams': {}}
+    previous_time = None
+    previous_typed = False
+    for time_ns, key, position, correct in log.entries():
+        typed = key not in (BACKSPACE, ENTER) and position < len(text)
+        if typed and previous_time is not None:
+            latency = (time_ns - previous_time) / 1e6
+            if 0 < latency <= max_gap_ms:
+                keys = [('chars', text[position])]
+                if previous_typed and position > 0:
+                    keys.append(('bigrams', text[position - 1:position + 1]))
+                for table, name in keys:
+                    entry = game[table].setdefault(name, [0.0, 0, 0])
+                    entry[0] += latency
+                    entry[1] += correct is False
+                    entry[2] += 1
+        previous_time = time_ns
+        previous_typed = typed
+
+    updated = {}
+    for table, limit in (('chars', None), ('bigrams', PROFILE_BIGRAMS)):
+        merged = {}
+        for name, (ms, errors, count) in profile.get(table, {}).items():
+            if count * PROFILE_DECAY >= 0.5:
+                merged[name] = [ms * PROFILE_DECAY, errors * PROFILE_DECAY, count * PROFILE_DECAY]
+        for name, (ms, errors, count) in game[table].items():
+            entry = merged.setdefault(name, [0.0, 0.0, 0.0])
+            entry[0] += ms
+            entry[1] += errors
+            entry[2] += count
+
+        items = sorted(merged.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        updated[table] = {name: [round(v, 2) for v in entry] for name, entry in items}
+    return updated
+
+
+def weak_keys(profile, count=6, min_count=3):
+    """The slowest and most error-prone keys as (key, weight) pairs, worst first"""
+    chars = profile.get('chars', {})
+    seen = [entry for entry in chars.values() if entry[2] >= min_count]
+    if not seen:
+        return []
+    baseline = sum(entry[0] for entry in seen) / sum(entry[2] for entry in seen)
+
+    scored = []
+    for table in ('chars', 'bigrams'):
+        for name, (ms, errors, n) in profile.get(table, {}).items():
+            if n >= min_count and name.strip():
+                scored.append(((ms / n) / baseline + ERROR_WEIGHT * errors / n, name))
+    scored.sort(reverse=True)
+    return [(name, score) for score, name in scored[:count]]
+
+
+def main():
+    from corpus import Corpus
+
+    parser = argparse.ArgumentParser(description='Build n-gram tables and print adaptive practice text')
+    parser.add_argument('corpus', nargs='?', default='sentences.txt')
+    parser.add_argument('--cache', default='typing_ngrams.json', help='where the tables are cached')
+    parser.add_argument('--weak', nargs='*', default=[], help='characters or bigrams to practise')
+    parser.add_argument('--length', type=int, default=180)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.corpus)
+    start = time.perf_counter()
+    tables = NGramTables.for_corpus(corpus, args.cache)
+    loaded = time.perf_counter()
+    text = tables.generate([(key, 1.0) for key in args.weak], args.length)
+    done = time.perf_counter()
+    corpus.close()
+
+    print(text)
+    print(f"\n{len(tables.words)} words; tables ready in {(loaded - start) * 1000:.0f} ms, "
+          f"text generated in {(done - loaded) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class FrameProfiler:
+    """Per-frame phase timings and render call counts
+
+    Phases may nest (draw_highlighted_text runs inside draw_game_screen), so
+    each phase reports its own inclusive time. Every finished frame is passed
+    to the registered hooks, which is how timings get exported.
+    """
+
+    PHASES = ('events', 'draw_game_screen', 'draw_highlighted_text', 'present')
+
+    def __init__(self, history=240):
+        self.frame_times = deque(maxlen=history)  # milliseconds, for the rolling graph
+        self.last_frame = None
+        self.hooks = []
+        self.frame_start = None
+        self.phase_times = {}
+        self.render_calls = 0
+
+    def add_hook(self, hook):
+        """Call hook(record) with the timings of every finished frame"""
+        self.hooks.append(hook)
+
+    def begin_frame(self):
+        """Start timing a frame"""
+        self.frame_start = time.perf_counter()
+        self.phase_times = {}
+        self.render_calls = 0
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of work as part of the current frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = self.phase_times.get(name, 0.0) + time.perf_counter() - start
+
+    def count_render(self, calls=1):
+        """Count font renders and blits made this frame"""
+        self.render_calls += calls
+
+    def end_frame(self):
+        """Finish the current frame and hand its record to the hooks"""
+        if self.frame_start is None:
+            return None
+
+        frame_ms = (time.perf_counter() - self.frame_start) * 1000
+        record = {'time': time.time(), 'frame_ms': round(frame_ms, 3)}
+        for name in self.PHASES:
+            record[f'{name}_ms'] = round(self.phase_times.get(name, 0.0) * 1000, 3)
+        record['render_calls'] = self.render_calls
+
+        self.frame_times.append(frame_ms)
+        self.last_frame = record
+        self.frame_start = None
+        for hook in self.hooks:
+            hook(record)
+        return record
+
+    def close(self):
+        """Close hooks that hold files open"""
+        for hook in self.hooks:
+            close = getattr(hook, 'close', None)
+            if close:
+                close()
+
+
+class PerfLog:
+    """Frame profiler hook that streams records to a .csv or .json file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.as_json = path.lower().endswith('.json')
+        self.file = open(path, 'w', newline='')
+        self.writer = None
+        self.count = 0
+        if self.as_json:
+            self.file.write('[\n')
+
+    def __call__(self, record):
+        if self.as_json:
+            if self.count:
+                self.file.write(',\n')
+            self.file.write(json.dumps(record))
+        else:
+            if self.writer is None:
+                self.writer = csv.DictWriter(self.file, fieldnames=list(record))
+                self.writer.writeheader()
+            self.writer.writerow(record)
+        self.count += 1
+
+    def close(self):
+        """Finish the file"""
+        if self.file.closed:
+            return
+        if self.as_json:
+            self.file.write('\n]\n')
+        self.file.close()
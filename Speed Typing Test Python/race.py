@@ -0,0 +1,447 @@
+"""LAN race mode: a small asyncio race server and the game's client
+
+Players connect over TCP and exchange newline-delimited JSON. Everyone in a
+race gets the same target text; the server collects progress updates and,
+once per tick, broadcasts the standings of every race that changed. A
+snapshot is encoded once per race and shared by all of its players, and
+slow clients simply miss snapshots instead of buffering them.
+
+    python race.py serve --port 8765
+    python race.py loadtest --clients 300
+    python "speed typing.py" --race 192.168.1.20:8765 --name Ada
+
+Client to server:
+    {"t":"join","name":"Ada"}           first message on a connection
+    {"t":"p","n":42,"w":61}             characters typed and live WPM
+    {"t":"done","n":80,"w":64,"a":97}   finished the text
+    {"t":"next"}                        move on to the next race
+Server to client:
+    {"t":"race","id":3,"text":"..."}
+    {"t":"s","id":3,"n":12,"p":[["Ada",42,61,0],...],"me":2,"c":40}
+        top players as [name, chars, wpm, place (0 while typing)], the
+        number of players in the race, the receiver's own rank and the
+        progress the server last saw from them
+"""
+import argparse
+import asyncio
+import json
+import random
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+
+DEFAULT_PORT = 8765
+STANDINGS_SIZE = 5  # rows of standings sent to every player
+MAX_LINE = 64 * 1024
+
+
+def encode(message):
+    """One compact protocol line"""
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+def parse_address(address):
+    """Split 'host:port' (or just 'host') into a (host, port) tuple"""
+    host, _, port = address.rpartition(':')
+    if not host:
+        return address, DEFAULT_PORT
+    return host, int(port)
+
+
+# Server
+
+class Player:
+    """One connected client as the server sees it"""
+
+    __slots__ = ('name', 'writer', 'race', 'chars', 'wpm', 'place')
+
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        self.race = None
+        self.chars = 0
+        self.wpm = 0
+        self.place = 0
+
+
+class Race:
+    """A shared target text and the players typing it"""
+
+    def __init__(self, race_id, text):
+        self.id = race_id
+        self.text = text
+        self.players = []
+        self.finished = 0
+        self.dirty = True
+
+    def standings(self):
+        """Finishers in finishing order, then everyone else by progress"""
+        return sorted(self.players, key=lambda p: (0, p.place) if p.place else (1, -p.chars))
+
+
+class RaceServer:
+    """Asyncio server handing out races and broadcasting standings every tick"""
+
+    def __init__(self, text_source, tick=0.1, max_buffer=256 * 1024):
+        self.text_source = text_source
+        self.tick = tick
+        self.max_buffer = max_buffer  # bytes queued for a client before snapshots are dropped
+        self.races = {}
+        self.names = set()
+        self.next_id = 1
+        self.current = self.new_race()
+        self.server = None
+        self.ticker = None
+
+    def new_race(self):
+        """Start a race that newly joining players are put in"""
+        race = Race(self.next_id, self.text_source())
+        self.next_id += 1
+        self.races[race.id] = race
+        self.current = race
+        return race
+
+    def unique_name(self, name):
+        """The requested player name, numbered if it is already taken"""
+        base = str(name or 'player')[:16]
+        name, n = base, 1
+        while name in self.names:
+            n += 1
+            name = f"{base}#{n}"
+        self.names.add(name)
+        return name
+
+    def send(self, player, data, droppable=False):
+        """Queue bytes for a player without waiting for the network"""
+        transport = player.writer.transport
+        if transport.is_closing():
+            return
+        if droppable and transport.get_write_buffer_size() > self.max_buffer:
+            return  # a slow client just misses this snapshot
+        player.writer.write(data)
+
+    def leave(self, player):
+        """Take a player out of their race"""
+        if player.race:
+            player.race.players.remove(player)
+            player.race.dirty = True
+            player.race = None
+
+    def join(self, player, race):
+        """Put a player in a race and send them its text"""
+        self.leave(player)
+        player.race = race
+        player.chars = player.wpm = player.place = 0
+        race.players.append(player)
+        race.dirty = True
+        self.send(player, encode({'t': 'race', 'id': race.id, 'text': race.text}))
+
+    def handle_message(self, player, message):
+        """Apply one message from a player that has joined"""
+        kind = message.get('t')
+        race = player.race
+        if kind == 'p':
+            player.chars = int(message.get('n', 0))
+            player.wpm = int(message.get('w', 0))
+            race.dirty = True
+        elif kind == 'done' and not player.place:
+            race.finished += 1
+            player.place = race.finished
+            player.chars = int(message.get('n', player.chars))
+            player.wpm = int(message.get('w', player.wpm))
+            race.dirty = True
+        elif kind == 'next':
+            # The first player to ask for the next race starts it
+            if race is self.current:
+                self.new_race()
+            self.join(player, self.current)
+
+    async def handle_client(self, reader, writer):
+        player = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if player is None:
+                        if message.get('t') == 'join':
+                            player = Player(self.unique_name(message.get('name')), writer)
+                            self.join(player, self.current)
+                    else:
+                        self.handle_message(player, message)
+                except (ValueError, TypeError, AttributeError):
+                    continue  # ignore malformed messages
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            if player:
+                self.leave(player)
+                self.names.discard(player.name)
+            writer.close()
+
+    def broadcast(self):
+        """Send fresh standings to the players of every race that changed"""
+        for race in list(self.races.values()):
+            if not race.players and race is not self.current:
+                del self.races[race.id]
+                continue
+            if not race.dirty:
+                continue
+            race.dirty = False
+
+            order = race.standings()
+            top = [[p.name, p.chars, p.wpm, p.place] for p in order[:STANDINGS_SIZE]]
+            # Encode the shared part once; each player only adds their own rank
+            head = json.dumps({'t': 's', 'id': race.id, 'n': len(order), 'p': top},
+                              separators=(',', ':'))[:-1]
+            for rank, player in enumerate(order, 1):
+                self.send(player, f'{head},"me":{rank},"c":{player.chars}}}\n'.encode(), droppable=True)
+
+    async def broadcast_loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.broadcast()
+
+    async def start(self, host='0.0.0.0', port=DEFAULT_PORT):
+        """Start listening and broadcasting; returns the asyncio server"""
+        self.server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        self.ticker = asyncio.create_task(self.broadcast_loop())
+        return self.server
+
+    async def serve(self, host='0.0.0.0', port=DEFAULT_PORT):
+        """Run until cancelled"""
+        server = await self.start(host, port)
+        print(f"Race server listening on {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.ticker.cancel()
+
+
+# Client
+
+class RaceClient:
+    """The game's connection to a race server, serviced by a background thread
+
+    The render loop never touches the socket: it only stores its latest
+    progress, which the thread sends at most once per interval, and reads
+    the race and standings the thread keeps up to date. notify() is called
+    from the thread whenever something arrives so the game can wake up.
+    """
+
+    def __init__(self, host, port, name, notify=None, interval=0.1):
+        self.address = (host, port)
+        self.name = name
+        self.notify = notify or (lambda: None)
+        self.interval = interval
+        self.race = None
+        self.standings = None
+        self.connected = False
+        self.sock = None
+        self.buffer = b''
+        self.progress = None
+        self.sent_progress = None
+        self.outbox = deque()
+        self.closing = threading.Event()
+        self.thread = None
+
+    def connect(self, timeout=5.0):
+        """Join the server and wait for the first race; raises OSError on failure"""
+        self.sock = socket.create_connection(self.address, timeout)
+        self.sock.sendall(encode({'t': 'join', 'name': self.name}))
+        deadline = time.monotonic() + timeout
+        while self.race is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._receive(remaining):
+                self.sock.close()
+                raise ConnectionError(f"No race from {self.address[0]}:{self.address[1]}")
+        self.connected = True
+        self.thread = threading.Thread(target=self._run, name='race-client', daemon=True)
+        self.thread.start()
+
+    def update(self, chars, wpm):
+        """Report progress; only the latest value is ever sent"""
+        self.progress = (chars, int(wpm))
+
+    def finish(self, chars, wpm, accuracy):
+        """Report that the current text is done"""
+        self.progress = self.sent_progress = (chars, int(wpm))
+        self.outbox.append({'t': 'done', 'n': chars, 'w': int(wpm), 'a': round(accuracy)})
+
+    def next_race(self):
+        """Ask for the next race; it arrives through notify()"""
+        self.progress = self.sent_progress = None
+        self.outbox.append({'t': 'next'})
+
+    def close(self):
+        """Disconnect and stop the thread"""
+        self.closing.set()
+        if self.thread:
+            self.thread.join(1.0)
+        if self.sock:
+            self.sock.close()
+        self.connected = False
+
+    def _handle(self, message):
+        kind = message.get('t')
+        if kind == 'race':
+            self.race = message
+            self.standings = None
+        elif kind == 's' and self.race and message.get('id') == self.race['id']:
+            self.standings = message
+        else:
+            return
+        self.notify()
+
+    def _receive(self, timeout):
+        """Wait up to timeout for data and handle complete lines; False once closed"""
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return True
+        data = self.sock.recv(65536)
+        if not data:
+            return False
+        *lines, self.buffer = (self.buffer + data).split(b'\n')
+        for line in lines:
+            try:
+                self._handle(json.loads(line))
+            except ValueError:
+                continue
+        return True
+
+    def _send_pending(self):
+        progress = self.progress
+        out = b''
+        if progress is not None and progress != self.sent_progress:
+            out += encode({'t': 'p', 'n': progress[0], 'w': progress[1]})
+            self.sent_progress = progress
+        while self.outbox:
+            out += encode(self.outbox.popleft())
+        if out:
+            self.sock.sendall(out)
+
+    def _run(self):
+        next_send = 0.0
+        try:
+            while not self.closing.is_set():
+                now = time.monotonic()
+                if now >= next_send:
+                    self._send_pending()
+                    next_send = now + self.interval
+                if not self._receive(max(0.0, next_send - time.monotonic())):
+                    break
+        except OSError:
+            pass
+        self.connected = False
+        self.notify()
+
+
+# Command line
+
+async def run_loadtest(args):
+    """Race simulated typists against a server and report throughput and latency"""
+    server = None
+    host, port = parse_address(args.connect) if args.connect else ('127.0.0.1', 0)
+    if not args.connect:
+        text = 'the quick brown fox jumps over the lazy dog ' * 40
+        server = RaceServer(lambda: text, tick=args.tick)
+        listener = await server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+
+    sent = 0
+    received = 0
+    latencies = []  # progress sent -> first standings that include it
+
+    async def typist(index):
+        nonlocal sent, received
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        writer.write(encode({'t': 'join', 'name': f'bot{index}'}))
+        race = json.loads(await reader.readline())
+        pending = {}
+        rng = random.Random(index)
+
+        async def listen():
+            nonlocal received
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                received += 1
+                message = json.loads(line)
+                if message.get('t') == 's':
+                    now = time.perf_counter()
+                    for chars in [c for c in pending if c <= message['c']]:
+                        latencies.append(now - pending.pop(chars))
+
+        listener_task = asyncio.create_task(listen())
+        chars = 0
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline and chars < len(race['text']):
+            await asyncio.sleep(args.interval * rng.uniform(0.8, 1.2))
+            chars += max(1, round(args.cps * args.interval))
+            pending[chars] = time.perf_counter()
+            writer.write(encode({'t': 'p', 'n': chars, 'w': int(args.cps * 12)}))
+            sent += 1
+        listener_task.cancel()
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(typist(i) for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    if server:
+        server.ticker.cancel()
+        server.server.close()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+    print(f"{args.clients} clients for {elapsed:.1f}s: {sent / elapsed:.0f} progress msgs/s in, "
+          f"{received / elapsed:.0f} standings msgs/s out")
+    print(f"progress -> standings latency: p50 {p50:.1f} ms, p95 {p95:.1f} ms "
+          f"({len(latencies)} samples, tick {args.tick * 1000:.0f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LAN typing races')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='run a race server')
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--corpus', default='sentences.txt',
+                       help='text file with one practice sentence per line')
+    serve.add_argument('--sentences', type=int, default=3, help='sentences per race text')
+    serve.add_argument('--tick', type=float, default=0.1, help='seconds between standings broadcasts')
+
+    loadtest = commands.add_parser('loadtest', help='race simulated clients against a server')
+    loadtest.add_argument('--connect', metavar='HOST:PORT',
+                          help='server to test (default: start one on localhost)')
+    loadtest.add_argument('--clients', type=int, default=200)
+    loadtest.add_argument('--duration', type=float, default=10.0, help='seconds of typing per client')
+    loadtest.add_argument('--cps', type=float, default=6.0, help='characters typed per second')
+    loadtest.add_argument('--interval', type=float, default=0.1, help='seconds between progress updates')
+    loadtest.add_argument('--tick', type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        from corpus import Corpus
+        corpus = Corpus(args.corpus)
+        server = RaceServer(lambda: ' '.join(corpus.sample() for _ in range(args.sentences)), args.tick)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            corpus.close()
+    else:
+        asyncio.run(run_loadtest(args))
+
+
+if __name__ == "__main__":
+    main()
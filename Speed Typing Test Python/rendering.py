@@ -0,0 +1,306 @@
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+
+import pygame
+
+
+class GlyphAtlas:
+    """Pre-rendered character surfaces for one font, keyed by colour role"""
+
+    ROLES = ('text', 'correct', 'error', 'cursor')
+
+    def __init__(self, font, colors):
+        self.font = font
+        self.colors = colors
+        self.glyphs = {}
+
+    def rebuild(self, colors):
+        """Drop every cached glyph and re-render for a new colour set"""
+        characters = {char for char, _ in self.glyphs}
+        self.colors = colors
+        self.glyphs = {}
+        self.prerender(characters)
+
+    def prerender(self, text):
+        """Render every character of text in every role up front"""
+        for char in set(text):
+            for role in self.ROLES:
+                self.get(char, role)
+
+    def get(self, char, role):
+        """Return the surface for char drawn in the colour of role"""
+        key = (char, role)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            glyph = self.font.render(char, True, self.colors[role])
+            self.glyphs[key] = glyph
+        return glyph
+
+
+class TextLayout:
+    """Line-wrapped target text shown through a scrolling viewport
+
+    Line breaks are computed lazily, only as far as the viewport has
+    scrolled, and only characters on visible lines are ever drawn, so the
+    cost of a frame does not depend on the length of the text. A newline
+    in the text takes the width of a space and forces a line break.
+    """
+
+    def __init__(self, text, atlas, max_width, line_height=35, visible_lines=3):
+        self.text = text
+        self.atlas = atlas
+        self.max_width = max_width
+        self.line_height = line_height
+        self.visible_lines = visible_lines
+        
+        # Lazily computed layout: x offset of each character and line starts
+        self.xs = array('i')
+        self.line_starts = [0]
+        self.next_x = 0
+        
+        self.top_line = 0
+        self.visible_start = 0
+        self.visible_end = 0
+        self.roles = ['text'] * len(text)
+        self.dirty = set()
+        self.dirty_all = False
+        self.surface = pygame.Surface((max_width, visible_lines * line_height), pygame.SRCALPHA)
+        self.redraw()
+
+    def glyph(self, index):
+        """Surface for the character at index in its current role"""
+        char = self.text[index]
+        return self.atlas.get(' ' if char == '\n' else char, self.roles[index])
+
+    def _layout_next(self):
+        """Place the next character, starting a new line when it does not fit"""
+        index = len(self.xs)
+        width = self.atlas.get(' ' if self.text[index] == '\n' else self.text[index], 'text').get_width()
+        if self.next_x + width > self.max_width and self.next_x > 0:
+            self.line_starts.append(index)
+            self.next_x = 0
+        self.xs.append(self.next_x)
+        self.next_x += width
+        if self.text[index] == '\n':
+            self.line_starts.append(index + 1)
+            self.next_x = 0
+
+    def _layout_through_line(self, line):
+        """Lay out characters until line has started, or the text ends"""
+        while len(self.line_starts) <= line and len(self.xs) < len(self.text):
+            self._layout_next()
+
+    def line_of(self, index):
+        """Line number of the character at index"""
+        while len(self.xs) <= index:
+            self._layout_next()
+        return bisect.bisect_right(self.line_starts, index) - 1
+
+    def _update_visible(self):
+        """Work out which characters fall inside the viewport"""
+        bottom = self.top_line + self.visible_lines
+        self._layout_through_line(bottom)
+        self.visible_start = self.line_starts[self.top_line]
+        self.visible_end = self.line_starts[bottom] if len(self.line_starts) > bottom else len(self.xs)
+
+    def glyph_rect(self, index):
+        """Rect covered by the character at index, relative to the viewport"""
+        y = (self.line_of(index) - self.top_line) * self.line_height
+        return pygame.Rect((self.xs[index], y), self.glyph(index).get_size())
+
+    def scroll_to(self, index):
+        """Scroll so the line holding index is visible with a line of context above"""
+        if not self.text:
+            return
+        line = self.line_of(min(index, len(self.text) - 1))
+        self._layout_through_line(line + 1)
+        last_line = len(self.line_starts) - 1
+        top = max(0, min(line - 1, last_line - self.visible_lines + 1))
+        if top != self.top_line:
+            self.top_line = top
+            self.redraw()
+
+    def set_role(self, index, role):
+        """Change the colour role of one character"""
+        if 0 <= index < len(self.text) and self.roles[index] != role:
+            self.roles[index] = role
+            if self.visible_start <= index < self.visible_end:
+                self.dirty.add(index)
+
+    def redraw(self):
+        """Render every visible character, e.g. after scrolling or a theme change"""
+        self._update_visible()
+        self.surface.fill((0, 0, 0, 0))
+        self.dirty = set(range(self.visible_start, self.visible_end))
+        self.dirty_all = True
+
+    def flush(self):
+        """Re-render only the characters whose role changed, returning their rects"""
+        if not self.dirty:
+            return []
+        
+        rects = []
+        blit_sequence = []
+        for index in self.dirty:
+            rect = self.glyph_rect(index)
+            self.surface.fill((0, 0, 0, 0), rect)
+            # Cells never overlap, so copy the glyph pixels as-is
+            blit_sequence.append((self.glyph(index), rect.topleft, None, pygame.BLEND_RGBA_MAX))
+            rects.append(rect)
+        self.surface.blits(blit_sequence, doreturn=False)
+        self.dirty = set()
+        
+        if self.dirty_all:
+            self.dirty_all = False
+            return [self.surface.get_rect()]
+        return rects
+
+
+class InputLine:
+    """The typed input drawn from atlas glyphs, scrolled to keep the cursor in view
+
+    The x offset of every typed character is kept in an array that grows
+    and shrinks with the input, so the cursor position never needs the
+    text to be measured. Each frame only blits the glyphs that fall inside
+    the box, whatever the length of the input.
+    """
+
+    def __init__(self, atlas, width, margin=60):
+        self.atlas = atlas
+        self.width = width
+        self.margin = margin  # room kept between the cursor and the edges
+        self.clear()
+
+    def clear(self):
+        """Forget all input"""
+        self.chars = []
+        self.xs = array('i', [0])  # start of each character, then the end of the text
+        self.scroll = 0
+
+    def __len__(self):
+        return len(self.chars)
+
+    def glyph(self, char):
+        """Surface for a typed character; a typed line break shows as a space"""
+        return self.atlas.get(' ' if char == '\n' else char, 'text')
+
+    def append(self, char):
+        """Add a character at the end"""
+        self.chars.append(char)
+        self.xs.append(self.xs[-1] + self.glyph(char).get_width())
+        self._follow_cursor()
+
+    def pop(self):
+        """Remove the last character"""
+        if self.chars:
+            self.chars.pop()
+            self.xs.pop()
+            self._follow_cursor()
+
+    def sync(self, typed):
+        """Catch up with a list of typed characters that only changed at its end"""
+        while len(self.chars) > len(typed):
+            self.pop()
+        for char in typed[len(self.chars):]:
+            self.append(char)
+
+    def _follow_cursor(self):
+        end = self.xs[-1]
+        if end - self.scroll > self.width - self.margin:
+            self.scroll = end - (self.width - self.margin)
+        elif end - self.scroll < self.margin:
+            self.scroll = max(0, end - self.margin)
+
+    @property
+    def cursor_x(self):
+        """Cursor position relative to the left edge of the box"""
+        return self.xs[-1] - self.scroll
+
+    def draw(self, surface, pos, height):
+        """Blit the visible glyphs with the box's left edge at pos"""
+        xs = self.xs
+        first = max(0, bisect.bisect_right(xs, self.scroll) - 1)
+        last = min(len(self.chars), bisect.bisect_left(xs, self.scroll + self.width))
+        x0 = pos[0] - self.scroll
+        blit_sequence = [(self.glyph(self.chars[i]), (x0 + xs[i], pos[1])) for i in range(first, last)]
+
+        # Glyphs cut by the edges are clipped to the box
+        clip = surface.get_clip()
+        surface.set_clip(clip.clip(pygame.Rect(pos[0], pos[1], self.width, height)))
+        surface.blits(blit_sequence, doreturn=False)
+        surface.set_clip(clip)
+        return len(blit_sequence)
+
+
+class FontCache(dict):
+    """Named fonts that are only created the first time they are used"""
+
+    SIZES = {'large': 48, 'medium': 32, 'small': 24, 'tiny': 18}
+
+    def __missing__(self, name):
+        font = pygame.font.Font(None, self.SIZES[name])
+        self[name] = font
+        return font
+
+
+class RenderCache(OrderedDict):
+    """Bounded LRU cache of rendered text keyed by (text, font name, colour)
+
+    Most labels are drawn again and again with the same text and colour, so
+    they are blitted from here instead of going through font.render. Only
+    the least recently used surfaces are dropped when the cache is full.
+    """
+
+    def __init__(self, fonts, max_entries=256):
+        super().__init__()
+        self.fonts = fonts
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, font_name, color):
+        """Surface for text in the named font and colour, rendered only on a miss"""
+        key = (text, font_name, tuple(color))
+        surface = self.get(key)
+        if surface is not None:
+            self.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.fonts[font_name].render(text, True, color)
+        self[key] = surface
+        if len(self) > self.max_entries:
+            self.popitem(last=False)
+        return surface
+
+
+class AssetLoader:
+    """Load and pre-scale images on a background thread
+
+    Results land in images (None for a file that failed to load) and ready()
+    turns true once every image was tried. Only loading and scaling happen off
+    the main thread; converting to the display format is left to the caller.
+    """
+
+    def __init__(self, paths, size):
+        self.size = size
+        self.images = {}
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(dict(paths),), name='asset-loader', daemon=True)
+        self.thread.start()
+
+    def ready(self):
+        """Whether every image has been loaded (or failed to)"""
+        return self.done.is_set()
+
+    def _run(self, paths):
+        for name, path in paths.items():
+            try:
+                image = pygame.image.load(path)
+                self.images[name] = pygame.transform.scale(image, self.size)
+            except (pygame.error, OSError):
+                self.images[name] = None
+        self.done.set()
@@ -0,0 +1,127 @@
+"""Re-score recorded games offline, in parallel
+
+Reads game records (typing_history.jsonl or any JSONL file of them),
+recomputes WPM, accuracy and error counts from each keystroke log with
+scoring.score_session and writes the updated records as JSONL, in input
+order. Input is read and output written as a stream with a bounded number
+of batches in flight, so memory stays flat however large the history is.
+Records without a keystroke log, and lines that are not valid JSON (such as
+a write cut short by a crash), are passed through unchanged.
+
+    python rescore.py typing_history.jsonl -o rescored.jsonl
+    python rescore.py - --workers 8 < typing_history.jsonl > rescored.jsonl
+    python rescore.py typing_history.jsonl --scoring alignment -o aligned.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from scoring import score_session
+
+
+def rescore_batch(lines, scoring=None):
+    """Re-score a batch of JSONL lines; returns (output text, rescored count, malformed count)"""
+    out = []
+    rescored = 0
+    malformed = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            out.append(line.rstrip('\n'))
+            malformed += 1
+            continue
+        try:
+            scores = score_session(record, scoring)
+        except ValueError:
+            out.append(line.rstrip('\n'))
+            continue
+        record.update(
+            wpm=round(scores['wpm'], 1),
+            accuracy=round(scores['accuracy'], 1),
+            time=round(scores['time'], 1),
+            errors=scores['errors'],
+            corrected_errors=scores['corrected_errors'],
+            uncorrected_errors=scores['uncorrected_errors']
+        )
+        if scoring:
+            record['scoring'] = scoring
+        out.append(json.dumps(record, separators=(',', ':')))
+        rescored += 1
+    return ''.join(line + '\n' for line in out), rescored, malformed
+
+
+def batches(lines, size):
+    """Group non-blank lines into lists of at most size"""
+    lines = (line for line in lines if line.strip())
+    while True:
+        batch = list(islice(lines, size))
+        if not batch:
+            return
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score recorded typing games in parallel')
+    parser.add_argument('history', help="JSONL game records, or '-' for stdin")
+    parser.add_argument('-o', '--output', help='where to write rescored records (default: stdout)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes')
+    parser.add_argument('--scoring', choices=['positional', 'alignment'],
+                        help='score every game this way (default: as each game was played)')
+    parser.add_argument('--batch', type=int, default=256, help='records sent to a worker at a time')
+    args = parser.parse_args()
+
+    source = sys.stdin if args.history == '-' else open(args.history, 'r')
+    sink = open(args.output, 'w') if args.output else sys.stdout
+    sessions = 0
+    rescored = 0
+    malformed = 0
+    start = time.perf_counter()
+    last_report = start
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"{sessions} sessions in {elapsed:.1f}s ({sessions / elapsed:.0f} sessions/s), "
+              f"{sessions - rescored - malformed} without keystrokes, {malformed} malformed lines skipped"
+              + ('' if final else '...'), file=sys.stderr)
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            pending = deque()  # (future, batch size), oldest first
+
+            def write_oldest():
+                nonlocal sessions, rescored, malformed, last_report
+                future, size = pending.popleft()
+                text, count, bad = future.result()
+                sink.write(text)
+                sessions += size
+                rescored += count
+                malformed += bad
+                if time.perf_counter() - last_report >= 2:
+                    last_report = time.perf_counter()
+                    report()
+
+            # Keep a couple of batches queued per worker; results are written in input order
+            for batch in batches(source, args.batch):
+                if len(pending) >= args.workers * 2:
+                    write_oldest()
+                pending.append((pool.submit(rescore_batch, batch, args.scoring), len(batch)))
+            while pending:
+                write_oldest()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    report(final=True)
+
+
+if __name__ == "__main__":
+    main()
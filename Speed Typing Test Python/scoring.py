@@ -0,0 +1,145 @@
+from keylog import KeystrokeLog, BACKSPACE, ENTER
+
+
+def compute_wpm(chars_typed, seconds):
+    """Words per minute, counting five typed characters as a word"""
+    if seconds <= 0:
+        return 0
+    return (chars_typed / 5) * (60 / seconds)
+
+
+def compute_accuracy(correct_chars, target_length):
+    """Percentage of the target text typed correctly"""
+    if target_length <= 0:
+        return 0
+    return (correct_chars / target_length) * 100
+
+
+class ScoringEngine:
+    """Keystroke-level scoring for one target text
+
+    The correctness of every typed position is kept in a byte array next to
+    running counters, so typing and deleting a character both cost O(1)
+    whatever the length of the passage. The engine has no pygame dependency.
+    """
+
+    def __init__(self, target=''):
+        self.reset(target)
+
+    def reset(self, target):
+        """Start scoring a new target text"""
+        self.target = target
+        self.typed = []
+        self.correct = bytearray()  # 1 where the typed character matches the target
+        self.correct_chars = 0
+        self.total_errors = 0  # every wrong keystroke, even if fixed later
+        self.corrected_errors = 0  # wrong characters removed with backspace
+        self.uncorrected_errors = 0  # wrong characters still in the input
+        self.changes = []  # target positions whose state changed, see take_changes
+        self._text = ''
+
+    def __len__(self):
+        return len(self.typed)
+
+    @property
+    def text(self):
+        """The typed input as a string (joined only after it changed)"""
+        if self._text is None:
+            self._text = ''.join(self.typed)
+        return self._text
+
+    @property
+    def cursor(self):
+        """Position in the target text where the next character is expected"""
+        return len(self.typed)
+
+    def is_correct(self, index):
+        """Whether the character typed at index matches the target"""
+        return bool(self.correct[index])
+
+    def target_state(self, index):
+        """True (typed correctly), False (mistyped) or None (not reached) for a target position"""
+        if index >= len(self.typed):
+            return None
+        return bool(self.correct[index])
+
+    def take_changes(self):
+        """Target positions whose state changed since the last call"""
+        changes = self.changes
+        self.changes = []
+        return changes
+
+    def type_char(self, char):
+        """Score one typed character; returns None past the end of the target"""
+        position = len(self.typed)
+        self.typed.append(char)
+        self._text = None
+
+        if position >= len(self.target):
+            self.correct.append(0)
+            return None
+
+        is_correct = char == self.target[position]
+        self.correct.append(is_correct)
+        self.changes.append(position)
+        if is_correct:
+            self.correct_chars += 1
+        else:
+            self.total_errors += 1
+            self.uncorrected_errors += 1
+        return is_correct
+
+    def backspace(self):
+        """Remove the last typed character; returns its position, or None if empty"""
+        if not self.typed:
+            return None
+
+        self.typed.pop()
+        was_correct = self.correct.pop()
+        self._text = None
+        position = len(self.typed)
+
+        if position < len(self.target):
+            self.changes.append(position)
+            if was_correct:
+                self.correct_chars -= 1
+            else:
+                self.uncorrected_errors -= 1
+                self.corrected_errors += 1
+        return position
+
+
+def score_session(record, scoring=None):
+    """Score a recorded game from its target text and keystroke log
+
+    Replays the keystrokes through a scoring engine and returns the same
+    figures the game computes at the end of a round. The round lasts from
+    the click that started it to its last keystroke. scoring is 'positional'
+    or 'alignment'; by default the game's own setting is used. Raises
+    ValueError for records saved without a keystroke log.
+    """
+    data = record.get('keystrokes')
+    if not data or 'text' not in record:
+        raise ValueError("record has no keystroke log")
+
+    log = KeystrokeLog.from_dict(data)
+    if (scoring or record.get('scoring')) == 'alignment':
+        from alignment import AlignmentEngine
+        engine = AlignmentEngine(record['text'])
+    else:
+        engine = ScoringEngine(record['text'])
+    for _, key, _, _ in log.entries():
+        if key == BACKSPACE:
+            engine.backspace()
+        elif key != ENTER:
+            engine.type_char(key)
+
+    seconds = (log.times[-1] - log.start_ns) / 1e9 if len(log) else 0
+    return {
+        'wpm': compute_wpm(len(engine), seconds),
+        'accuracy': compute_accuracy(engine.correct_chars, len(engine.target)),
+        'time': seconds,
+        'errors': engine.total_errors,
+        'corrected_errors': engine.corrected_errors,
+        'uncorrected_errors': engine.uncorrected_errors
+    }
@@ -1,12 +1,25 @@
 import pygame
 from pygame.locals import *
 import sys
+import argparse
 import time
 import random
-import json
 import os
+import threading
 from datetime import datetime
 from enum import Enum
+from collections import deque
+
+from alignment import AlignmentEngine
+from corpus import Corpus
+from difficulty import DifficultyIndex
+from keylog import KeystrokeLog, BACKSPACE, ENTER
+from ngrams import NGramTables, update_key_profile, weak_keys
+from perf import FrameProfiler, PerfLog
+from race import RaceClient, parse_address
+from rendering import AssetLoader, FontCache, GlyphAtlas, InputLine, RenderCache, TextLayout
+from scoring import ScoringEngine, compute_accuracy, compute_wpm
+from stats_store import StatsStore, StatsWriter
 
 
 class Difficulty(Enum):
@@ -14,6 +27,7 @@ class Difficulty(Enum):
     MEDIUM = "medium"
     HARD = "hard"
     EXPERT = "expert"
+    ADAPTIVE = "adaptive"  # generated text aimed at the player's weakest keys
 
 class Theme(Enum):
     DARK = "dark"
@@ -21,9 +35,20 @@ class Theme(Enum):
     NEON = "neon"
     RETRO = "retro"
 
+# Posted by the race client thread when a race or new standings arrive
+RACE_UPDATE = pygame.event.custom_type()
+
+# Posted by the analytics worker thread with the finished report
+ANALYTICS_READY = pygame.event.custom_type()
+
 class TypingGame:
    
-    def __init__(self):
+    def __init__(self, corpus_path='sentences.txt', stats_dir='.', perf_log=None, passage_mode=False,
+                 alignment_mode=False):
+        # Startup is measured up to the first interactive frame
+        self.launch_ns = time.perf_counter_ns()
+        self.time_to_interactive = None
+        
         # Screen dimensions
         self.w = 1200
         self.h = 700
@@ -31,7 +56,7 @@ class TypingGame:
         # Game state
         self.reset = True
         self.active = False
-        self.input_text = ''
+        self.scoring = ScoringEngine()
         self.target_text = ''
         self.time_start = 0
         self.total_time = 0
@@ -39,37 +64,96 @@ class TypingGame:
         self.wpm = 0
         self.end = False
         self.char_index = 0
+        self.text_layout = None
+        
+        # Monotonic high-resolution clock; replays substitute a virtual one
+        self.clock_ns = time.perf_counter_ns
+        self.keylog = KeystrokeLog()
+        self.replaying = False
+        
+        # Analytics page reachable from the results screen
+        self.show_analytics = False
+        self.analytics_report = None  # None while the worker thread is computing it
+        self.analytics_request = 0
+        self.last_record = None  # newest game, which may still be queued for writing
+        
+        # Dirty-rectangle rendering: only changed regions are redrawn and pushed
+        self.dirty_rendering = True
+        self.full_redraw = True
+        self.dirty_rects = []
+        self.cursor_visible = False
+        self.stats_text = ''
+        self.text_origin = (70, 290)  # three 35 px lines end above the input box
+        self.input_rect = pygame.Rect(50, 400, self.w - 100, 60)
+        self.stats_rect = pygame.Rect(0, 485, self.w, 30)
+        
+        # Background and fixed labels, composited once per theme/difficulty/active state
+        self.static_layer = None
+        self.static_layer_key = None
+        
+        # Performance overlay (F3) and optional export of per-frame timings
+        self.profiler = FrameProfiler()
+        if perf_log:
+            self.profiler.add_hook(PerfLog(perf_log))
+        self.show_perf_hud = False
+        self.hud_rect = pygame.Rect(10, 10, 330, 206)
         
         # Settings
         self.difficulty = Difficulty.MEDIUM
         self.theme = Theme.DARK
+        self.passage_mode = passage_mode  # multi-paragraph texts in a scrolling viewport
+        self.passage_length = 2000
+        self.alignment_mode = alignment_mode  # score by edit-distance alignment instead of by position
         self.sound_enabled = True
         
-        # Statistics
+        # LAN race (see race.py); None when playing alone
+        self.race = None
+        self.race_id = None
+        self.standings_rect = pygame.Rect(0, 525, self.w, 160)
+        
+        # Sentence corpus, indexed on first use
+        self.corpus = Corpus(corpus_path)
+        
+        # Difficulty buckets of the corpus lines, rated once on a background thread and kept
+        # in an index file; rounds sample the whole corpus until the index is ready
+        self.difficulty_index = None
+        self.difficulty_index_path = os.path.join(stats_dir, 'typing_difficulty.idx')
+        self.difficulty_thread = threading.Thread(target=self.load_difficulty_index,
+                                                  name='difficulty-index', daemon=True)
+        self.difficulty_thread.start()
+        
+        # N-gram tables for adaptive practice, built on a background thread the first time
+        # adaptive mode is played and cached on disk; rounds sample the corpus until they are ready
+        self.ngrams = None
+        self.ngrams_path = os.path.join(stats_dir, 'typing_ngrams.json')
+        self.ngrams_thread = None
+        self.adaptive_focus = []
+        
+        # Statistics: small aggregates file plus an append-only history log
+        self.stats_store = StatsStore(os.path.join(stats_dir, 'typing_stats.json'),
+                                      os.path.join(stats_dir, 'typing_history.jsonl'))
         self.stats = self.load_stats()
-        self.current_errors = 0
-        self.correct_chars = 0
+        self.stats_writer = StatsWriter(self.stats_store)
         
         # Colors - will be set by theme
         self.colors = {}
+        self.glyph_atlas = None
         self.set_theme_colors()
         
-        # Real-time feedback
-        self.char_colors = []
+        # Initialize only the pygame subsystems the game uses
+        pygame.display.init()
+        pygame.font.init()
         
-        # Initialize pygame
-        pygame.init()
+        # Images load and scale in the background while the window opens
+        self.assets = AssetLoader({'open': 'type-speed-open.png', 'bg': 'background.jpg'}, (self.w, self.h))
+        self.assets_applied = False
+        self.open_img = None
+        self.bg = None
         
-        # Load images with error handling
-        try:
-            self.open_img = pygame.image.load('type-speed-open.png')
-            self.open_img = pygame.transform.scale(self.open_img, (self.w, self.h))
-            
-            self.bg = pygame.image.load('background.jpg')
-            self.bg = pygame.transform.scale(self.bg, (self.w, self.h))
-        except pygame.error:
-            self.open_img = None
-            self.bg = None
+        # The splash fades out over the first round while input is accepted
+        self.splash_pending = True
+        self.splash_start = None
+        self.splash_duration = 0.6
         
         # Sound system disabled for compatibility
         self.sound_enabled = False
@@ -77,15 +161,31 @@ class TypingGame:
         self.screen = pygame.display.set_mode((self.w, self.h))
         pygame.display.set_caption('Advanced Speed Typing Test')
         
-        # Fonts
-        self.fonts = {
-            'large': pygame.font.Font(None, 48),
-            'medium': pygame.font.Font(None, 32),
-            'small': pygame.font.Font(None, 24),
-            'tiny': pygame.font.Font(None, 18)
-        }
+        # Fonts are created on first use; rendered labels and buttons are cached
+        self.fonts = FontCache()
+        self.text_cache = RenderCache(self.fonts)
+        self.button_surfaces = {}
+        self.hovered_button = None
+        
+        # Pre-rendered glyphs for the target text, also used for the typed input
+        self.glyph_atlas = GlyphAtlas(self.fonts['medium'], self.colors)
+        self.input_line = InputLine(self.glyph_atlas, self.input_rect.w - 40)
        
         
+    @property
+    def correct_chars(self):
+        """Typed characters that match the target"""
+        return self.scoring.correct_chars
+    
+    @property
+    def current_errors(self):
+        """Wrong keystrokes this round, including ones fixed with backspace"""
+        return self.scoring.total_errors
+    
+    def now(self):
+        """Current time in seconds from the game clock"""
+        return self.clock_ns() / 1e9
+    
     def play_sound(self, sound_name):
         """Sound system disabled for compatibility"""
         pass
@@ -128,33 +228,47 @@ class TypingGame:
             }
         }
         self.colors = themes.get(self.theme, themes[Theme.DARK])
+        
+        # Glyphs are rendered per theme, so re-render them with the new colors
+        if self.glyph_atlas:
+            self.glyph_atlas.rebuild(self.colors)
+        if self.text_layout:
+            self.text_layout.redraw()
     
     def load_stats(self):
         """Load statistics from file"""
-        try:
-            with open('typing_stats.json', 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {
-                'games_played': 0,
-                'best_wpm': 0,
-                'best_accuracy': 0,
-                'total_time': 0,
-                'history': []
-            }
+        return self.stats_store.load()
+    
+    def save_stats(self, game_record):
+        """Queue the game and the aggregates for the background writer"""
+        self.stats_writer.submit(game_record, self.stats)
     
-    def save_stats(self):
-        """Save statistics to file"""
-        with open('typing_stats.json', 'w') as f:
-            json.dump(self.stats, f, indent=2)
+    def shutdown(self):
+        """Flush pending statistics and release the corpus"""
+        self.stats_writer.close()
+        readers = (self.difficulty_thread, self.ngrams_thread)
+        if not any(thread and thread.is_alive() for thread in readers):
+            self.corpus.close()  # otherwise a background thread is still reading it; exiting releases it
+        if self.race:
+            self.race.close()
+        self.profiler.close()
     
-    def draw_text(self, msg, pos, font_size='medium', color=None, center=True):
-        """Enhanced text drawing with better positioning"""
+    def draw_text(self, msg, pos, font_size='medium', color=None, center=True, surface=None, cached=True):
+        """Enhanced text drawing with better positioning
+        
+        Text goes through the LRU render cache unless cached is False, which
+        is meant for strings that change every frame.
+        """
         if color is None:
             color = self.colors['text']
         
-        font = self.fonts[font_size]
-        text = font.render(msg, True, color)
+        if cached:
+            misses = self.text_cache.misses
+            text = self.text_cache.render(msg, font_size, color)
+            renders = 1 + self.text_cache.misses - misses
+        else:
+            text = self.fonts[font_size].render(msg, True, color)
+            renders = 2
         
         if center:
             if isinstance(pos, tuple) and len(pos) == 2:
@@ -164,33 +278,41 @@ class TypingGame:
         else:
             text_rect = text.get_rect(topleft=pos)
         
-        self.screen.blit(text, text_rect)
+        (surface or self.screen).blit(text, text_rect)
+        self.profiler.count_render(renders)  # blit, plus the font render on a cache miss
         return text_rect   
         
     def get_text_by_difficulty(self):
         """Get text based on difficulty level"""
-        try:
-            with open('sentences.txt', 'r') as f:
-                sentences = [line.strip() for line in f if line.strip()]
-        except FileNotFoundError:
-            sentences = [
-                "The quick brown fox jumps over the lazy dog.",
-                "Programming is the art of telling another human what one wants the computer to do.",
-                "In order to understand recursion, you must first understand recursion."
-            ]
+        if self.race:
+            # Everyone in the race types the text the server handed out
+            self.race_id = self.race.race['id']
+            return self.race.race['text']
+        
+        if self.passage_mode:
+            # Several paragraphs, typed through the scrolling viewport
+            return self.corpus.sample_passage(self.passage_length, wait=False)
         
         if self.difficulty == Difficulty.EASY:
             # Return shorter, simpler sentences
-            easy_sentences = [s for s in sentences if len(s) < 50 and s.count(',') <= 1]
-            return random.choice(easy_sentences if easy_sentences else sentences[:3])
+            return self.sample_level('easy')
         elif self.difficulty == Difficulty.MEDIUM:
             # Return medium length sentences
-            return random.choice(sentences)
+            return self.sample_level('medium')
+        elif self.difficulty == Difficulty.ADAPTIVE:
+            # Common corpus words rich in the keys the player is slowest or least accurate at
+            ngrams = self.get_ngrams()
+            if ngrams is None:
+                self.adaptive_focus = []
+                return self.corpus.sample(wait=False)
+            weak = weak_keys(self.stats.get('key_profile', {}))
+            self.adaptive_focus = [key for key, _ in weak]
+            return ngrams.generate(weak)
         elif self.difficulty == Difficulty.HARD:
-            # Return longer sentences or combine multiple
-            if len(sentences) > 1 and random.random() < 0.5:
-                return f"{random.choice(sentences)} {random.choice(sentences)}"
-            return random.choice(sentences)
+            # Return longer sentences or combine multiple (once indexed, counting lines cannot block)
+            if self.difficulty_index is not None and len(self.corpus) > 1 and random.random() < 0.5:
+                return f"{self.sample_level('hard')} {self.sample_level('hard')}"
+            return self.sample_level('hard')
         else:  # EXPERT
             # Return very challenging text with numbers and symbols
             expert_additions = [
@@ -200,31 +322,55 @@ class TypingGame:
             ]
             if random.random() < 0.3:
                 return random.choice(expert_additions)
-            return random.choice(sentences)
-
+            return self.sample_level('expert')
+    
+    def load_difficulty_index(self):
+        """Background thread: load the difficulty index, or rate the corpus when it is missing or stale"""
+        self.corpus.load()  # first, so that rounds sampling without waiting get corpus lines soon
+        self.difficulty_index = DifficultyIndex.for_corpus(self.corpus, self.difficulty_index_path)
+    
+    def sample_level(self, level):
+        """A corpus sentence of a difficulty level, or any sentence while the index is being built
+        
+        Never waits for the index thread to finish scanning the corpus file:
+        until then the round gets one of the fallback sentences.
+        """
+        index = self.difficulty_index
+        if index is None:
+            return self.corpus.sample(wait=False)
+        return index.sample(level)
+    
+    def load_ngrams(self):
+        """Background thread: load the n-gram tables, or build them when the cache is missing or stale"""
+        self.ngrams = NGramTables.for_corpus(self.corpus, self.ngrams_path)
+    
+    def get_ngrams(self):
+        """N-gram tables of the corpus, or None while the background thread is still loading them"""
+        if self.ngrams is None and self.ngrams_thread is None:
+            self.ngrams_thread = threading.Thread(target=self.load_ngrams, name='ngram-tables', daemon=True)
+            self.ngrams_thread.start()
+        return self.ngrams
+    
     def calculate_results(self):
         """Calculate typing results with improved accuracy"""
         if self.end:
             return
             
-        self.total_time = time.time() - self.time_start
-        
-        # More accurate accuracy calculation
-        if len(self.target_text) > 0:
-            self.accuracy = (self.correct_chars / len(self.target_text)) * 100
-        else:
-            self.accuracy = 0
+        self.total_time = self.now() - self.time_start
         
-        # WPM calculation (standard: 5 characters = 1 word)
-        if self.total_time > 0:
-            self.wpm = (len(self.input_text) / 5) * (60 / self.total_time)
-        else:
-            self.wpm = 0
+        # Same formulas as offline rescoring (see scoring.py and rescore.py)
+        self.accuracy = compute_accuracy(self.correct_chars, len(self.target_text))
+        self.wpm = compute_wpm(len(self.scoring), self.total_time)
         
         self.end = True
+        self.mark_dirty()
+        
+        if self.race and not self.replaying:
+            self.race.finish(self.scoring.cursor, self.wpm, self.accuracy)
         
-        # Update statistics
-        self.update_stats()
+        # Update statistics (a replayed game is already in the history)
+        if not self.replaying:
+            self.update_stats()
     
     def update_stats(self):
         """Update and save statistics"""
@@ -237,23 +383,27 @@ class TypingGame:
         if self.accuracy > self.stats['best_accuracy']:
             self.stats['best_accuracy'] = self.accuracy
         
-        # Add to history
+        # Per-key latency and errors that adaptive practice is aimed at
+        self.stats['key_profile'] = update_key_profile(self.stats.get('key_profile', {}),
+                                                       self.keylog, self.target_text)
+        
+        # Record for the history log
         game_record = {
             'date': datetime.now().isoformat(),
             'wpm': round(self.wpm, 1),
             'accuracy': round(self.accuracy, 1),
             'time': round(self.total_time, 1),
             'difficulty': self.difficulty.value,
-            'errors': self.current_errors
+            'scoring': 'alignment' if self.alignment_mode else 'positional',
+            'errors': self.current_errors,
+            'corrected_errors': self.scoring.corrected_errors,
+            'uncorrected_errors': self.scoring.uncorrected_errors,
+            'text': self.target_text,
+            'keystrokes': self.keylog.to_dict()
         }
         
-        self.stats['history'].append(game_record)
-        
-        # Keep only last 50 games
-        if len(self.stats['history']) > 50:
-            self.stats['history'] = self.stats['history'][-50:]
-        
-        self.save_stats()
+        self.last_record = game_record
+        self.save_stats(game_record)
     
     def draw_results_screen(self):
         """Draw comprehensive results screen"""
@@ -261,6 +411,10 @@ class TypingGame:
         
         # Title
         self.draw_text("Test Complete!", (self.w // 2, 100), 'large', self.colors['text'])
+        if self.race and self.race.standings:
+            standings = self.race.standings
+            self.draw_text(f"Race position: {standings['me']} of {standings['n']}",
+                           (self.w // 2, 150), 'small', self.colors['correct'])
         
         # Main results
         y_pos = 200
@@ -268,7 +422,8 @@ class TypingGame:
             f"WPM: {self.wpm:.1f}",
             f"Accuracy: {self.accuracy:.1f}%",
             f"Time: {self.total_time:.1f}s",
-            f"Errors: {self.current_errors}"
+            f"Errors: {self.current_errors} ({self.scoring.corrected_errors} corrected, "
+            f"{self.scoring.uncorrected_errors} uncorrected)"
         ]
         
         for result in results:
@@ -292,112 +447,474 @@ class TypingGame:
             y_pos += 30
         
         # Buttons
-        self.draw_button("Play Again", (self.w // 2 - 100, self.h - 100), (200, 50))
-        self.draw_button("Settings", (self.w // 2 + 120, self.h - 100), (120, 50))
+        self.draw_screen_buttons()
+    
+    def open_analytics(self):
+        """Show the analytics page and compute its report on a worker thread"""
+        self.analytics_request += 1
+        self.analytics_report = None
+        self.show_analytics = True
+        self.mark_dirty()
+        threading.Thread(target=self.compute_analytics, args=(self.analytics_request, self.last_record),
+                         name='analytics', daemon=True).start()
+    
+    def compute_analytics(self, request, last_record):
+        """Worker thread: analyze the history plus the newest game and post the report"""
+        # NumPy is only imported when the page is first opened
+        import analytics
+        
+        def records():
+            # The newest game may still be waiting in the stats writer's queue
+            last_date = None
+            for record in self.stats_store.iter_history():
+                last_date = record.get('date') if isinstance(record, dict) else None
+                yield record
+            if last_record is not None and last_record['date'] != last_date:
+                yield last_record
+        
+        try:
+            report = analytics.analyze(records())
+        except (RuntimeError, OSError) as e:
+            report = {'error': str(e)}
+        except Exception as e:
+            # Whatever goes wrong, the page must not stay on "Computing…"
+            report = {'error': f"Analytics failed: {e!r}"}
+        pygame.event.post(pygame.event.Event(ANALYTICS_READY, request=request, report=report))
+    
+    def draw_analytics_screen(self):
+        """Draw slowest keys, slowest bigrams and WPM trends"""
+        self.screen.fill(self.colors['bg'])
+        self.draw_text("Typing Analytics", (self.w // 2, 60), 'large', self.colors['text'])
+        report = self.analytics_report
+        
+        if report is None:
+            self.draw_text("Computing…", (self.w // 2, 200), 'small', self.colors['text'])
+        elif 'error' in report:
+            self.draw_text(report['error'], (self.w // 2, 200), 'small', self.colors['error'])
+        else:
+            self.draw_text(f"{report['games']} games, {report['keystrokes']} timed keystrokes",
+                           (self.w // 2, 110), 'small', self.colors['text'])
+            
+            columns = [
+                ("Slowest keys", [f"'{row['char']}'  {row['mean_ms']:.0f} ms  {row['error_rate']:.0%} err"
+                                  for row in report['chars'][:8]]),
+                ("Slowest bigrams", [f"'{row['bigram']}'  {row['mean_ms']:.0f} ms  {row['error_rate']:.0%} err"
+                                     for row in report['bigrams'][:8]]),
+                ("WPM by difficulty", [f"{name.title()}: {trend['recent_wpm']:.0f} ({trend['wpm_per_game']:+.2f}/game)"
+                                       for name, trend in sorted(report['trends'].items())])
+            ]
+            for i, (title, lines) in enumerate(columns):
+                x = self.w * (2 * i + 1) // 6
+                self.draw_text(title, (x, 170), 'medium', self.colors['correct'])
+                y_pos = 215
+                for line in lines or ["Not enough data yet"]:
+                    self.draw_text(line, (x, y_pos), 'small', self.colors['text'])
+                    y_pos += 32
+        
+        self.draw_screen_buttons()
+    
+    def screen_buttons(self):
+        """Buttons of the current screen as (action, label, rect) tuples"""
+        if not self.end:
+            return []
+        if self.show_analytics:
+            return [('back', "Back", pygame.Rect(self.w // 2 - 100, self.h - 100, 200, 50))]
+        return [
+            ('analytics', "Analytics", pygame.Rect(self.w // 2 - 320, self.h - 100, 200, 50)),
+            ('play_again', "Next Race" if self.race and self.race.connected else "Play Again",
+             pygame.Rect(self.w // 2 - 100, self.h - 100, 200, 50)),
+            ('settings', "Settings", pygame.Rect(self.w // 2 + 120, self.h - 100, 120, 50))
+        ]
+    
+    def button_at(self, pos):
+        """Action of the button under pos, or None"""
+        for action, _, rect in self.screen_buttons():
+            if rect.collidepoint(pos):
+                return action
+        return None
+    
+    def draw_screen_buttons(self):
+        """Draw the current screen's buttons, highlighting the one under the mouse"""
+        for action, label, rect in self.screen_buttons():
+            self.draw_button(label, rect.topleft, rect.size, hover=action == self.hovered_button)
+    
+    def get_button_surface(self, text, size, hover):
+        """Button artwork, rendered once per theme for both hover states"""
+        key = (self.theme, text, tuple(size), hover)
+        if key not in self.button_surfaces:
+            for state in (False, True):
+                surface = pygame.Surface(size, pygame.SRCALPHA)
+                rect = surface.get_rect()
+                color = self.colors['button_hover'] if state else self.colors['button']
+                pygame.draw.rect(surface, color, rect, border_radius=10)
+                pygame.draw.rect(surface, self.colors['input_border'], rect, 2, border_radius=10)
+                self.draw_text(text, rect.center, 'small', self.colors['text'], surface=surface)
+                self.button_surfaces[key[:3] + (state,)] = surface
+        return self.button_surfaces[key]
     
     def draw_button(self, text, pos, size, hover=False):
         """Draw a modern button"""
-        color = self.colors['button_hover'] if hover else self.colors['button']
         rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
-        pygame.draw.rect(self.screen, color, rect, border_radius=10)
-        pygame.draw.rect(self.screen, self.colors['input_border'], rect, 2, border_radius=10)
-        
-        # Center text in button
-        text_pos = (pos[0] + size[0] // 2, pos[1] + size[1] // 2)
-        self.draw_text(text, text_pos, 'small', self.colors['text'])
+        self.screen.blit(self.get_button_surface(text, size, hover), rect)
+        self.profiler.count_render(1)
         return rect
 
+    def mark_dirty(self, rect=None):
+        """Schedule a region for redraw, or the whole screen when no rect is given"""
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty_rects.append(pygame.Rect(rect))
+    
+    def live_stats_text(self):
+        """Build the real-time stats line shown below the input box"""
+        if not (self.active and not self.end and self.time_start > 0):
+            return ''
+        
+        current_time = self.now() - self.time_start
+        typed = len(self.scoring)
+        current_wpm = self.live_wpm()
+        current_accuracy = (self.correct_chars / typed) * 100 if typed > 0 else 100
+        
+        return f"WPM: {current_wpm:.0f} | Accuracy: {current_accuracy:.0f}% | Time: {current_time:.0f}s"
+    
+    def live_wpm(self):
+        """WPM of the round in progress"""
+        current_time = self.now() - self.time_start
+        return compute_wpm(len(self.scoring), max(current_time, 1))
+    
+    def apply_loaded_assets(self):
+        """Pick up images from the background loader once they are ready"""
+        if self.assets_applied or not self.assets.ready():
+            return
+        self.assets_applied = True
+        
+        bg = self.assets.images.get('bg')
+        if bg:
+            self.bg = bg.convert()
+            self.bg.set_alpha(30)  # Make it subtle
+            self.static_layer = None
+            self.mark_dirty()
+        
+        # Only greet with the splash if the player has not started yet
+        open_img = self.assets.images.get('open')
+        if open_img and self.splash_pending and not self.active and not self.end:
+            self.open_img = open_img.convert()
+            self.splash_start = self.now()
+        self.splash_pending = False
+    
+    def splash_alpha(self):
+        """Current opacity of the fading splash, 0 once it is gone"""
+        if self.splash_start is None or self.open_img is None:
+            return 0
+        progress = (self.now() - self.splash_start) / self.splash_duration
+        if progress >= 1:
+            self.splash_start = None
+            return 0
+        return int(255 * (1 - progress))
+    
+    def update_animations(self):
+        """Track time-driven state (cursor blink, live stats) and mark what changed"""
+        self.apply_loaded_assets()
+        if self.splash_start is not None:
+            self.mark_dirty()  # the fade is a full-screen animation
+        cursor_visible = self.active and not self.end and bool(int(self.now() * 2) % 2)
+        if cursor_visible != self.cursor_visible:
+            self.cursor_visible = cursor_visible
+            self.mark_dirty(self.input_rect)
+        
+        stats_text = self.live_stats_text()
+        if stats_text != self.stats_text:
+            self.stats_text = stats_text
+            self.mark_dirty(self.stats_rect)
+    
+    def idle_timeout(self):
+        """Milliseconds until the next cursor blink, or None when nothing animates"""
+        if self.splash_start is not None or not self.assets_applied:
+            return 16  # splash fade or assets still loading
+        if not self.active or self.end:
+            return None
+        return int((0.5 - self.now() % 0.5) * 1000) + 1
+    
     def draw_typing_area(self):
         """Draw the main typing interface with real-time feedback"""
         # Input box
-        input_rect = pygame.Rect(50, 400, self.w - 100, 60)
+        input_rect = self.input_rect
         pygame.draw.rect(self.screen, self.colors['input_bg'], input_rect, border_radius=10)
         pygame.draw.rect(self.screen, self.colors['input_border'], input_rect, 3, border_radius=10)
         
         # Target text with character-by-character highlighting
-        self.draw_highlighted_text()
+        with self.profiler.phase('draw_highlighted_text'):
+            self.draw_highlighted_text()
         
-        # Input text
-        input_surface = self.fonts['medium'].render(self.input_text, True, self.colors['text'])
-        self.screen.blit(input_surface, (70, 420))
+        # Input text: only the glyphs visible in the horizontally scrolled box
+        text_x = input_rect.x + 20
+        blits = self.input_line.draw(self.screen, (text_x, 420), input_rect.h - 20)
+        self.profiler.count_render(blits)
         
-        # Cursor
-        if self.active and not self.end:
-            cursor_x = 70 + input_surface.get_width()
-            if int(time.time() * 2) % 2:  # Blinking cursor
-                pygame.draw.line(self.screen, self.colors['cursor'], 
-                               (cursor_x, 415), (cursor_x, 445), 2)
+        # Blinking cursor
+        if self.cursor_visible:
+            cursor_x = text_x + self.input_line.cursor_x
+            pygame.draw.line(self.screen, self.colors['cursor'], 
+                           (cursor_x, 415), (cursor_x, 445), 2)
         
         # Real-time stats
-        if self.active and not self.end and self.time_start > 0:
-            current_time = time.time() - self.time_start
-            current_wpm = (len(self.input_text) / 5) * (60 / max(current_time, 1))
-            current_accuracy = (self.correct_chars / max(len(self.input_text), 1)) * 100 if len(self.input_text) > 0 else 100
-            
-            stats_text = f"WPM: {current_wpm:.0f} | Accuracy: {current_accuracy:.0f}% | Time: {current_time:.0f}s"
-            self.draw_text(stats_text, (self.w // 2, 500), 'small', self.colors['text'])
+        if self.stats_text:
+            self.draw_text(self.stats_text, (self.w // 2, 500), 'small', self.colors['text'])
     
     def draw_highlighted_text(self):
         """Draw target text with character-by-character highlighting"""
         if not self.target_text:
-            return
+            return []
         
-        font = self.fonts['medium']
-        x, y = 70, 300
-        max_width = self.w - 140
-        
-        for i, char in enumerate(self.target_text):
-            # Determine color based on typing progress
-            if i < len(self.input_text):
-                if i < len(self.input_text) and self.input_text[i] == char:
-                    color = self.colors['correct']
-                else:
-                    color = self.colors['error']
-            elif i == len(self.input_text):
-                color = self.colors['cursor']  # Current character
-            else:
-                color = self.colors['text']  # Untyped characters
-            
-            char_surface = font.render(char, True, color)
-            
-            # Handle line wrapping
-            if x + char_surface.get_width() > max_width:
-                x = 70
-                y += 35
-            
-            self.screen.blit(char_surface, (x, y))
-            x += char_surface.get_width()
+        # Only characters whose state changed since the last frame are re-rendered
+        changed = self.text_layout.flush()
+        self.screen.blit(self.text_layout.surface, self.text_origin)
+        self.profiler.count_render(1 + len(changed))
+        return [rect.move(self.text_origin) for rect in changed]
     
     def handle_typing(self, event):
         """Handle typing input with improved feedback"""
         if not self.active or self.end:
             return
         
+        # Input text, cursor and highlighted span all change with a keystroke
+        self.mark_dirty(self.input_rect)
+        now_ns = self.clock_ns()
+        
         if event.key == pygame.K_RETURN:
-            if len(self.input_text) >= len(self.target_text) * 0.8:  # Allow completion at 80%
-                self.calculate_results()
+            cursor = self.scoring.cursor
+            if self.target_text[cursor:cursor + 1] == '\n':
+                # In passages ENTER types the paragraph break the text expects
+                self.type_character('\n', now_ns)
+            else:
+                self.keylog.record(now_ns, ENTER, cursor)
+                if cursor >= len(self.target_text) * 0.8:  # Allow completion at 80%
+                    self.calculate_results()
             
         elif event.key == pygame.K_BACKSPACE:
-            if len(self.input_text) > 0:
-                self.input_text = self.input_text[:-1]
-                self.char_index = len(self.input_text)
-                # Recalculate correct chars
-                self.correct_chars = sum(1 for i, c in enumerate(self.input_text) 
-                                       if i < len(self.target_text) and c == self.target_text[i])
+            self.scoring.backspace()
+            self.keylog.record(now_ns, BACKSPACE, self.scoring.cursor)
         
         elif event.unicode and event.unicode.isprintable():
-            self.input_text += event.unicode
-            
-            # Check if character is correct
-            if len(self.input_text) <= len(self.target_text):
-                if self.input_text[-1] == self.target_text[len(self.input_text) - 1]:
-                    self.correct_chars += 1
+            self.type_character(event.unicode, now_ns)
+        
+        self.update_highlight()
+        self.input_line.sync(self.scoring.typed)
+        
+        # Keep the line being typed inside the text viewport
+        self.text_layout.scroll_to(self.scoring.cursor)
+        
+        # The race client sends this at its own pace
+        if self.race and not self.end:
+            self.race.update(self.scoring.cursor, self.live_wpm())
+    
+    def type_character(self, char, now_ns):
+        """Score one typed character against the target"""
+        position = self.scoring.cursor
+        
+        # Check if character is correct
+        is_correct = self.scoring.type_char(char)
+        self.keylog.record(now_ns, char[0], position, is_correct)
+        
+        # Auto-complete when reaching end
+        if self.scoring.cursor >= len(self.target_text):
+            self.calculate_results()
+    
+    def update_highlight(self):
+        """Recolour the target characters the scoring engine reports as changed"""
+        cursor = self.scoring.cursor
+        for index in set(self.scoring.take_changes()) | {self.char_index, cursor}:
+            if index == cursor:
+                role = 'cursor'
+            else:
+                state = self.scoring.target_state(index) if index < len(self.target_text) else None
+                role = 'text' if state is None else 'correct' if state else 'error'
+            self.text_layout.set_role(index, role)
+        self.char_index = cursor
+    
+    def handle_event(self, event):
+        """Dispatch a single pygame event"""
+        if event.type == QUIT:
+            self.running = False
+            sys.exit()
+        
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.mark_dirty()
+        
+        elif event.type == RACE_UPDATE:
+            # The client's last notification can arrive after the race was left
+            if self.race:
+                self.on_race_update()
+        
+        elif event.type == ANALYTICS_READY:
+            # Reports of an earlier opening of the page are stale
+            if event.request == self.analytics_request:
+                self.analytics_report = event.report
+                self.mark_dirty()
+        
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            self.mark_dirty()
+            if not self.end:
+                # Check if clicking in input area
+                if self.input_rect.collidepoint(event.pos):
+                    self.active = True
+                    if not self.time_start:
+                        start_ns = self.clock_ns()
+                        self.time_start = start_ns / 1e9
+                        self.keylog.start_ns = start_ns
+            else:
+                # Handle button clicks on the results and analytics screens
+                action = self.button_at(event.pos)
+                if action == 'back':
+                    self.show_analytics = False
+                elif action == 'analytics':
+                    self.open_analytics()
+                elif action == 'play_again':
+                    if self.race and self.race.connected:
+                        self.race.next_race()  # the game resets when the race arrives
+                    else:
+                        self.reset_game()
+                elif action == 'settings':
+                    self.show_settings_menu()
+            # The screen may have changed under the pointer
+            self.hovered_button = self.button_at(event.pos)
+        
+        elif event.type == pygame.MOUSEMOTION:
+            hovered = self.button_at(event.pos)
+            if hovered != self.hovered_button:
+                for action, _, rect in self.screen_buttons():
+                    if action in (hovered, self.hovered_button):
+                        self.mark_dirty(rect)
+                self.hovered_button = hovered
+        
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                self.mark_dirty()
+                if self.show_analytics:
+                    self.show_analytics = False
+                elif self.active:
+                    self.active = False
                 else:
-                    self.current_errors += 1
-            
-            # Auto-complete when reaching end
-            if len(self.input_text) >= len(self.target_text):
-                self.calculate_results()
+                    self.running = False
+            elif event.key == pygame.K_F1:  # F1 for quick settings
+                self.show_settings_menu()
+            elif event.key == pygame.K_F2:  # F2 to toggle theme
+                self.mark_dirty()
+                themes = list(Theme)
+                current_index = themes.index(self.theme)
+                self.theme = themes[(current_index + 1) % len(themes)]
+                self.set_theme_colors()
+            elif event.key == pygame.K_F3:  # F3 toggles the performance overlay
+                self.show_perf_hud = not self.show_perf_hud
+                self.mark_dirty()
+            elif event.key == pygame.K_F4:  # F4 toggles long-passage mode
+                self.passage_mode = not self.passage_mode
+                self.reset_game()
+            elif event.key == pygame.K_F5:  # F5 switches between positional and alignment scoring
+                self.alignment_mode = not self.alignment_mode
+                self.reset_game()
+            else:
+                self.handle_typing(event)
+    
+    def join_race(self, address, name):
+        """Connect to a race server and type its texts from now on"""
+        host, port = parse_address(address)
+        self.race = RaceClient(host, port, name, notify=lambda: pygame.event.post(pygame.event.Event(RACE_UPDATE)))
+        self.race.connect()
+    
+    def leave_race(self):
+        """Close the race connection and play alone from now on"""
+        self.race.close()
+        self.race = None
+        self.race_id = None
+    
+    def on_race_update(self):
+        """Start the next race once it arrives, otherwise redraw the standings"""
+        if self.race.race['id'] != self.race_id and (self.end or not self.active):
+            self.reset_game()
+        elif self.end:
+            self.mark_dirty(pygame.Rect(0, 135, self.w, 30))
+        else:
+            self.mark_dirty(self.standings_rect)
+    
+    def draw_race_standings(self):
+        """Draw the live race standings below the typing area"""
+        standings = self.race.standings
+        y_pos = self.standings_rect.y + 10
+        if not self.race.connected:
+            title = "Disconnected from the race server"
+        elif standings is None:
+            title = "Waiting for other racers..."
+        else:
+            title = f"Race #{standings['id']}: you are {standings['me']} of {standings['n']}"
+        self.draw_text(title, (self.w // 2, y_pos), 'small', self.colors['text'])
+        
+        for rank, (name, chars, wpm, place) in enumerate(standings['p'] if standings else [], 1):
+            y_pos += 26
+            progress = f"finished #{place}" if place else f"{min(100, chars * 100 // len(self.target_text))}%"
+            color = self.colors['correct'] if rank == standings['me'] else self.colors['text']
+            self.draw_text(f"{rank}. {name}   {progress}   {wpm} WPM", (self.w // 2, y_pos), 'tiny', color)
+    
+    def next_events(self):
+        """Return pending events, blocking while there is nothing to redraw"""
+        if self.dirty_rendering and not self.full_redraw and not self.dirty_rects:
+            timeout = self.idle_timeout()
+            # NOEVENT comes back on timeout and is simply ignored
+            event = pygame.event.wait() if timeout is None else pygame.event.wait(timeout)
+            return [event] + pygame.event.get()
+        return pygame.event.get()
+    
+    def render_frame(self):
+        """Redraw what changed and push it to the display, returning the updated rects"""
+        self.update_animations()
+        
+        # Highlighted characters that changed colour are part of this frame
+        if not self.end and self.text_layout:
+            for rect in self.text_layout.flush():
+                self.mark_dirty(rect.move(self.text_origin))
+        
+        # The overlay refreshes along with any frame that draws something
+        if self.show_perf_hud and (self.full_redraw or self.dirty_rects):
+            self.mark_dirty(self.hud_rect)
+        
+        if self.dirty_rendering and not self.full_redraw:
+            rects = self.dirty_rects
+            if not rects:
+                return []
+            # Everything drawn below is clipped to the changed area
+            self.screen.set_clip(rects[0].unionall(rects[1:]))
+        else:
+            rects = [self.screen.get_rect()]
+        
+        # Draw everything
+        if not self.end:
+            with self.profiler.phase('draw_game_screen'):
+                self.draw_game_screen()
+        elif self.show_analytics:
+            self.draw_analytics_screen()
+        else:
+            self.draw_results_screen()
+        splash_alpha = self.splash_alpha()
+        if splash_alpha:
+            self.open_img.set_alpha(splash_alpha)
+            self.screen.blit(self.open_img, (0, 0))
+        if self.show_perf_hud:
+            self.draw_perf_hud()
+        self.screen.set_clip(None)
+        
+        with self.profiler.phase('present'):
+            if self.full_redraw or not self.dirty_rendering:
+                pygame.display.flip()
+            else:
+                pygame.display.update(rects)
+        
+        self.full_redraw = False
+        self.dirty_rects = []
+        
+        if self.time_to_interactive is None:
+            self.time_to_interactive = (time.perf_counter_ns() - self.launch_ns) / 1e6  # shown in the F3 overlay
+        return rects
     
     def run(self):
         """Main game loop with improved structure"""
@@ -406,95 +923,171 @@ class TypingGame:
         
         self.running = True
         while self.running:
-            mouse_pos = pygame.mouse.get_pos()
+            events = self.next_events()
             
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    self.running = False
-                    sys.exit()
-                
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if not self.end:
-                        # Check if clicking in input area
-                        input_rect = pygame.Rect(50, 400, self.w - 100, 60)
-                        if input_rect.collidepoint(mouse_pos):
-                            self.active = True
-                            if not self.time_start:
-                                self.time_start = time.time()
-                    else:
-                        # Handle button clicks on results screen
-                        play_again_rect = pygame.Rect(self.w // 2 - 100, self.h - 100, 200, 50)
-                        settings_rect = pygame.Rect(self.w // 2 + 120, self.h - 100, 120, 50)
-                        
-                        if play_again_rect.collidepoint(mouse_pos):
-                            self.reset_game()
-                        elif settings_rect.collidepoint(mouse_pos):
-                            self.show_settings_menu()
-                
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        if self.active:
-                            self.active = False
-                        else:
-                            self.running = False
-                    elif event.key == pygame.K_F1:  # F1 for quick settings
-                        self.show_settings_menu()
-                    elif event.key == pygame.K_F2:  # F2 to toggle theme
-                        themes = list(Theme)
-                        current_index = themes.index(self.theme)
-                        self.theme = themes[(current_index + 1) % len(themes)]
-                        self.set_theme_colors()
-                    elif event.key == pygame.K_F3:  # F3 reserved for future features
-                        pass  # Could add more features here
-                    else:
-                        self.handle_typing(event)
+            # Time spent blocked waiting for events is not part of the frame
+            self.profiler.begin_frame()
+            with self.profiler.phase('events'):
+                for event in events:
+                    self.handle_event(event)
             
-            # Draw everything
-            if not self.end:
-                self.draw_game_screen()
-            else:
-                self.draw_results_screen()
-            
-            pygame.display.flip()
+            self.render_frame()
+            self.profiler.end_frame()
             clock.tick(60)
     
-    def draw_game_screen(self):
-        """Draw the main game screen"""
-        self.screen.fill(self.colors['bg'])
+    def draw_perf_hud(self):
+        """Draw the F3 overlay: frame time, per-phase timings and a frame-time graph"""
+        hud = self.hud_rect
+        panel = pygame.Surface(hud.size, pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 180))
+        self.screen.blit(panel, hud.topleft)
+        
+        frame_times = self.profiler.frame_times
+        last = self.profiler.last_frame
+        lines = []
+        if self.time_to_interactive is not None:
+            lines.append(f"Startup: {self.time_to_interactive:.0f} ms to first frame")
+        if frame_times:
+            average = sum(frame_times) / len(frame_times)
+            lines.append(f"Frame: {frame_times[-1]:.2f} ms (avg {average:.2f}, max {max(frame_times):.2f})")
+        if last:
+            for name in self.profiler.PHASES:
+                lines.append(f"{name}: {last[f'{name}_ms']:.2f} ms")
+            lines.append(f"Render calls: {last['render_calls']}")
+        cache = self.text_cache
+        lookups = cache.hits + cache.misses
+        if lookups:
+            lines.append(f"Text cache: {cache.hits} hits, {cache.misses} misses "
+                         f"({cache.hits / lookups:.0%}), {len(cache)} entries")
+        
+        # The overlay's own numbers change every frame, so they bypass the cache
+        y = hud.y + 8
+        for line in lines:
+            self.draw_text(line, (hud.x + 8, y), 'tiny', (255, 255, 255), center=False, cached=False)
+            y += 16
+        
+        # Rolling frame-time graph, 0-33 ms
+        graph = pygame.Rect(hud.x + 8, hud.bottom - 58, hud.w - 16, 50)
+        pygame.draw.rect(self.screen, (90, 90, 90), graph, 1)
+        if len(frame_times) > 1:
+            step = graph.w / (frame_times.maxlen - 1)
+            points = [(graph.x + i * step, graph.bottom - min(ms, 33.3) / 33.3 * graph.h)
+                      for i, ms in enumerate(frame_times)]
+            pygame.draw.lines(self.screen, (100, 255, 100), False, points)
+    
+    def replay(self, record, realtime=False):
+        """Feed a recorded game back through handle_typing on a virtual clock
+        
+        Keystrokes are applied at their recorded timestamps, so the replayed
+        round reproduces the original input, highlighting and results. With
+        realtime=True the replay is drawn and paced like the original session.
+        """
+        # Any non-zero epoch works; zero would read as "timer not started"
+        start_ns = 10 ** 9
+        log = KeystrokeLog.from_dict(record['keystrokes'], start_ns)
+        virtual_ns = start_ns
+        self.clock_ns = lambda: virtual_ns
+        self.replaying = True
+        
+        alignment_mode = self.alignment_mode
+        try:
+            self.alignment_mode = record.get('scoring') == 'alignment'
+            self.reset_game(record['text'])
+            self.active = True
+            self.time_start = start_ns / 1e9
+            self.keylog.start_ns = start_ns
+            wall_start = time.perf_counter_ns()
+            
+            for time_ns, key, position, correct in log.entries():
+                if realtime:
+                    # Keep drawing (cursor blink, live stats) until the keystroke is due
+                    while True:
+                        elapsed = time.perf_counter_ns() - wall_start
+                        if start_ns + elapsed >= time_ns:
+                            break
+                        virtual_ns = start_ns + elapsed
+                        pygame.event.pump()
+                        self.render_frame()
+                        time.sleep(min((time_ns - start_ns - elapsed) / 1e9, 1 / 60))
+                
+                virtual_ns = time_ns
+                if key == BACKSPACE:
+                    event = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_BACKSPACE, unicode='')
+                elif key in (ENTER, '\n'):
+                    event = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, unicode='\r')
+                else:
+                    event = pygame.event.Event(pygame.KEYDOWN, key=0, unicode=key)
+                self.handle_typing(event)
+                if realtime:
+                    self.render_frame()
+                if self.end:
+                    break
+        finally:
+            self.clock_ns = time.perf_counter_ns
+            self.replaying = False
+            self.alignment_mode = alignment_mode
+    
+    def get_static_layer(self):
+        """Return the background and fixed labels, re-compositing only when they change"""
+        key = (self.theme, self.difficulty, self.active, self.passage_mode, self.alignment_mode,
+               tuple(self.adaptive_focus), self.race is not None)
+        if self.static_layer is not None and self.static_layer_key == key:
+            return self.static_layer
+        
+        layer = pygame.Surface((self.w, self.h)).convert()
+        layer.fill(self.colors['bg'])
         
         # Draw background if available
         if self.bg:
-            # Scale and center background
-            bg_scaled = pygame.transform.scale(self.bg, (self.w, self.h))
-            bg_surface = pygame.Surface((self.w, self.h))
-            bg_surface.blit(bg_scaled, (0, 0))
-            bg_surface.set_alpha(30)  # Make it subtle
-            self.screen.blit(bg_surface, (0, 0))
+            layer.blit(self.bg, (0, 0))
         
         # Title
-        self.draw_text("Advanced Speed Typing Test", (self.w // 2, 50), 'large', self.colors['text'])
+        self.draw_text("Advanced Speed Typing Test", (self.w // 2, 50), 'large', self.colors['text'], surface=layer)
         
         # Difficulty indicator
         diff_text = f"Difficulty: {self.difficulty.value.title()}"
-        self.draw_text(diff_text, (self.w // 2, 100), 'small', self.colors['text'])
+        if self.difficulty == Difficulty.ADAPTIVE and self.adaptive_focus:
+            diff_text += " | Practising: " + "  ".join(key.replace(' ', '_') for key in self.adaptive_focus)
+        if self.race:
+            diff_text = f"LAN race | {self.race.address[0]}:{self.race.address[1]}"
+        elif self.passage_mode:
+            diff_text = "Passage mode | Press F4 for single sentences"
+        self.draw_text(diff_text, (self.w // 2, 100), 'small', self.colors['text'], surface=layer)
         
         # Instructions
         if not self.active:
             self.draw_text("Click in the text box below and start typing!", 
-                         (self.w // 2, 150), 'small', self.colors['text'])
+                         (self.w // 2, 150), 'small', self.colors['text'], surface=layer)
             self.draw_text("Press ESC to quit | Press ENTER to finish early (80% minimum)", 
-                         (self.w // 2, 180), 'tiny', self.colors['text'])
+                         (self.w // 2, 180), 'tiny', self.colors['text'], surface=layer)
             self.draw_text(f"Theme: {self.theme.value.title()} | Press F2 to change theme", 
-                         (self.w // 2, 200), 'tiny', self.colors['text'])
+                         (self.w // 2, 200), 'tiny', self.colors['text'], surface=layer)
+            scoring = "forgives skipped and extra letters" if self.alignment_mode else "letter by letter"
+            self.draw_text(f"Scoring: {scoring} | Press F5 to switch", 
+                         (self.w // 2, 220), 'tiny', self.colors['text'], surface=layer)
         
         # Target text label
-        self.draw_text("Type this text:", (self.w // 2, 250), 'small', self.colors['text'])
+        self.draw_text("Type this text:", (self.w // 2, 250), 'small', self.colors['text'], surface=layer)
+        
+        self.static_layer = layer
+        self.static_layer_key = key
+        return layer
+    
+    def draw_game_screen(self):
+        """Draw the main game screen"""
+        # Background, title, difficulty, instructions and label in one blit
+        self.screen.blit(self.get_static_layer(), (0, 0))
         
         # Main typing area
         self.draw_typing_area()
+        
+        if self.race:
+            self.draw_race_standings()
     
     def show_settings_menu(self):
         """Cycle through settings"""
+        self.mark_dirty()
+        
         # Cycle through themes
         themes = list(Theme)
         current_index = themes.index(self.theme)
@@ -506,44 +1099,91 @@ class TypingGame:
         current_index = difficulties.index(self.difficulty)
         self.difficulty = difficulties[(current_index + 1) % len(difficulties)]
 
-    def reset_game(self):
-        """Reset game state for a new round"""
-        # Show splash screen briefly if available
-        if self.open_img:
-            self.screen.blit(pygame.transform.scale(self.open_img, (self.w, self.h)), (0, 0))
-            pygame.display.flip()
-            pygame.time.wait(500)  # Brief pause
+    def reset_game(self, text=None):
+        """Reset game state for a new round, optionally with a given target text"""
+        # A lost race connection goes back to solo play instead of repeating its last text
+        if self.race and not self.race.connected:
+            self.leave_race()
         
         # Reset game state
+        self.mark_dirty()
         self.reset = False
         self.end = False
+        self.show_analytics = False
         self.active = False
-        self.input_text = ''
         self.time_start = 0
         self.total_time = 0
+        self.keylog = KeystrokeLog()
         self.wpm = 0
         self.accuracy = 0
         self.char_index = 0
-        self.current_errors = 0
-        self.correct_chars = 0
-        self.char_colors = []
         
         # Get new text based on difficulty
-        self.target_text = self.get_text_by_difficulty()
+        self.target_text = text or self.get_text_by_difficulty()
         if not self.target_text:
             self.target_text = "The quick brown fox jumps over the lazy dog."
+        engine = AlignmentEngine if self.alignment_mode else ScoringEngine
+        self.scoring = engine(self.target_text)
+        self.input_line.clear()
         
-        # Initialize character colors
-        self.char_colors = [self.colors['text']] * len(self.target_text)
+        # Render the new text's glyphs before the first frame
+        self.glyph_atlas.prerender(self.target_text)
+        
+        # Lay out the target text once; keystrokes only update character colors
+        self.text_layout = TextLayout(self.target_text, self.glyph_atlas, self.w - 210)
+        self.update_highlight()
 
 
 
 if __name__ == "__main__":
-    game = TypingGame()
+    parser = argparse.ArgumentParser(description='Advanced Speed Typing Test')
+    parser.add_argument('--corpus', default='sentences.txt',
+                        help='text file with one practice sentence per line')
+    parser.add_argument('--passage', action='store_true',
+                        help='practise multi-paragraph passages instead of single sentences')
+    parser.add_argument('--alignment', action='store_true',
+                        help='score by aligning input with the text, forgiving skipped and extra letters')
+    parser.add_argument('--race', metavar='HOST:PORT',
+                        help='join a LAN race server started with "python race.py serve"')
+    parser.add_argument('--name', default=os.environ.get('USER') or os.environ.get('USERNAME') or 'player',
+                        help='your name in race standings')
+    parser.add_argument('--perf-log', metavar='PATH',
+                        help='export per-frame timings to a .csv or .json file')
+    parser.add_argument('--replay', metavar='HISTORY',
+                        help='replay a recorded game from a typing_history.jsonl file')
+    parser.add_argument('--replay-index', type=int, default=-1,
+                        help='which game in the history to replay (default: the last one)')
+    args = parser.parse_args()
+    
+    game = TypingGame(corpus_path=args.corpus, perf_log=args.perf_log, passage_mode=args.passage,
+                      alignment_mode=args.alignment)
     try:
-        game.run()
+        if args.race:
+            try:
+                game.join_race(args.race, args.name)
+            except OSError as e:
+                print(f"Could not join the race at {args.race}: {e}")
+                sys.exit(1)
+        
+        if args.replay:
+            store = StatsStore(history_path=args.replay)
+            if args.replay_index < 0:
+                recent = deque(store.iter_history(), maxlen=-args.replay_index)
+                record = recent[0] if len(recent) == -args.replay_index else None
+            else:
+                record = next((r for i, r in enumerate(store.iter_history()) if i == args.replay_index), None)
+            
+            if record is None or 'keystrokes' not in record:
+                print("No recorded keystrokes for that game")
+            else:
+                game.replay(record, realtime=True)
+                print(f"Recorded: {record['wpm']:.1f} WPM, {record['accuracy']:.1f}% | "
+                      f"Replayed: {game.wpm:.1f} WPM, {game.accuracy:.1f}%")
+        else:
+            game.run()
     except KeyboardInterrupt:
         print("\nGame interrupted by user")
     finally:
+        game.shutdown()
         pygame.quit()
 
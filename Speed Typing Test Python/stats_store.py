@@ -0,0 +1,152 @@
+import json
+import os
+import queue
+import sys
+import threading
+import traceback
+
+
+class StatsStore:
+    """Append-only game history next to a small file of rolling aggregates
+
+    Every finished game is one line appended to a JSONL history file, so
+    recording a game costs the same whether the history holds 50 or 500,000
+    entries. Totals and personal bests live in the small stats file, which is
+    all the game needs to read at startup.
+    """
+
+    def __init__(self, stats_path='typing_stats.json', history_path='typing_history.jsonl'):
+        self.stats_path = stats_path
+        self.history_path = history_path
+
+    @staticmethod
+    def empty_stats():
+        """Aggregates for a player with no games yet"""
+        return {
+            'games_played': 0,
+            'best_wpm': 0,
+            'best_accuracy': 0,
+            'total_time': 0
+        }
+
+    def load(self):
+        """Load the aggregates, migrating an old stats file that embeds its history"""
+        try:
+            with open(self.stats_path, 'r') as f:
+                stats = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return self.empty_stats()
+
+        if 'history' in stats:
+            self.migrate(stats)
+
+        return {**self.empty_stats(), **stats}
+
+    def migrate(self, stats):
+        """Move the history list of an old stats file into the append-only log"""
+        history = stats.pop('history')
+
+        # History is written before the stats file is rewritten, so an
+        # interrupted migration simply runs again on the next start
+        if not os.path.exists(self.history_path):
+            tmp_path = self.history_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                for record in history:
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            os.replace(tmp_path, self.history_path)
+
+        self.save(stats)
+
+    def append(self, record):
+        """Add one game record to the end of the history"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Add several game records with a single write"""
+        if not records:
+            return
+        lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        with open(self.history_path, 'a') as f:
+            f.write(lines)
+
+    def save(self, stats):
+        """Atomically replace the aggregates file"""
+        tmp_path = self.stats_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f, indent=2)
+        os.replace(tmp_path, self.stats_path)
+
+    def iter_history(self):
+        """Yield game records oldest first without loading the whole file
+
+        Lines that do not parse, such as a write cut short by a crash or one
+        still being appended, are skipped.
+        """
+        try:
+            with open(self.history_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+        except FileNotFoundError:
+            return
+
+
+class StatsWriter:
+    """Background thread that persists game results for a StatsStore
+
+    The render thread only enqueues work. Whatever piled up in the queue is
+    written in one go, and only the newest aggregates snapshot is saved, so
+    back-to-back games coalesce into a single write. The queue is bounded;
+    submit only waits if the disk falls that many games behind.
+    """
+
+    def __init__(self, store, max_pending=64):
+        self.store = store
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name='stats-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, game_record, stats):
+        """Queue a game record and a snapshot of the aggregates for writing"""
+        self.queue.put((game_record, dict(stats)))
+
+    def flush(self):
+        """Block until everything submitted so far is on disk"""
+        self.queue.join()
+
+    def close(self, timeout=5.0):
+        """Flush everything still queued and stop the writer thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            # Coalesce everything that arrived while the last write was running
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = None in batch
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    self.store.append_many([record for record, _ in items])
+                    self.store.save(items[-1][1])
+            except OSError as e:
+                print(f"Could not save statistics: {e}", file=sys.stderr)
+            except Exception:
+                # Keep the thread alive, or flush() and close() would wait forever
+                print("Unexpected error while saving statistics:", file=sys.stderr)
+                traceback.print_exc()
+            finally:
+                for _ in batch:
+                    self.queue.task_done()